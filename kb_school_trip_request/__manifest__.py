@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'School Trip Request',
-    'version': '16.0.1.0.0',
+    'version': '16.0.1.1.0',
     'summary': 'نموذج طلب رحلة مدرسية',
     'description': 'إدارة طلبات الرحلات المدرسية وطباعة النموذج العربي الرسمي مع شعار التهذيب.',
     'category': 'Education',
@@ -18,11 +18,23 @@
     'data': [
         'security/groups.xml',
         'security/ir.model.access.csv',
+        'security/ir_rule.xml',
         'data/school_trip_sequence.xml',
         'data/event_type_data.xml',
+        'data/mail_message_subtype_data.xml',
+        'data/ir_cron_data.xml',
         'report/school_trip_report.xml',
         'views/school_trip_request_views.xml',
         'views/event_event_views.xml',
+        'views/school_trip_bus_line_views.xml',
+        'views/school_school_views.xml',
+        'views/res_users_views.xml',
+        'views/school_trip_report_batch_views.xml',
+        'views/school_trip_analysis_views.xml',
+        'views/school_trip_job_views.xml',
+        'views/school_trip_profile_views.xml',
+        'wizard/school_trip_import_wizard_views.xml',
+        'wizard/school_trip_capacity_wizard_views.xml',
     ],
     'assets': {
         'web.report_assets_common': [
@@ -0,0 +1,94 @@
+# controllers/main.py
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+from datetime import datetime
+
+from werkzeug.exceptions import BadRequest
+
+from odoo import http
+from odoo.http import request
+
+# حجم الصفحة الافتراضي والأقصى لواجهة التصدير
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+MAX_CHANGES_PAGE_SIZE = 5000
+
+
+def _encode_cursor(write_date, record_id):
+    return '%s_%s' % (write_date.isoformat(), record_id)
+
+
+def _decode_cursor(cursor):
+    try:
+        write_date, record_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(write_date), int(record_id)
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+
+class SchoolTripDispatchController(http.Controller):
+
+    @http.route('/kb_school_trip/api/trips', type='http', auth='user', methods=['GET'], csrf=False)
+    def approved_trips(self, cursor=None, limit=None, **kwargs):
+        """
+        الطلبات المعتمدة مع حافلاتها بترقيم مفتاحي على (write_date, id).
+        كل صفحة تكلف عدداً ثابتاً من الاستعلامات مهما كبر السجل التاريخي.
+        السطور التي لم تنتهِ معاملات أقدم منها تؤجل للصفحة التالية بدل أن تُتخطى.
+        تنبيه: معاملة طويلة لمستخدم قاعدة البيانات (مهمة مجدولة أو استيراد أو جلسة خاملة
+        داخل معاملة) توقف الصفحات الجديدة حتى تنتهي. لمتابعة التغييرات بلا هذا التوقف
+        يُستخدم /kb_school_trip/api/changes المبني على سجل التغييرات.
+        """
+        try:
+            limit = min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+        except ValueError:
+            raise BadRequest("Invalid limit")
+
+        Trip = request.env['school.trip.request']
+        domain = [
+            ('state', '=', 'approved'),
+            ('write_date', '<', request.env['school.trip.change']._oldest_transaction_start()),
+        ]
+        if cursor:
+            write_date, last_id = _decode_cursor(cursor)
+            domain += [
+                '|', ('write_date', '>', write_date),
+                '&', ('write_date', '=', write_date), ('id', '>', last_id),
+            ]
+        query = Trip._search(domain, order='write_date, id', limit=limit)
+        request.env.cr.execute(*query.select(
+            '"school_trip_request"."id"', '"school_trip_request"."write_date"'
+        ))
+        rows = request.env.cr.fetchall()
+
+        trips = Trip.browse([row[0] for row in rows])
+        body = json.dumps({
+            'trips': trips._get_dispatch_payload() if trips else [],
+            'next_cursor': _encode_cursor(*rows[-1][::-1]) if rows else cursor,
+            'has_more': len(rows) == limit,
+        }, ensure_ascii=False, separators=(',', ':'))
+
+        etag = hashlib.sha1(body.encode()).hexdigest()
+        if request.httprequest.if_none_match.contains(etag):
+            return request.make_response('', headers=[('ETag', '"%s"' % etag)], status=304)
+        return request.make_response(body, headers=[
+            ('Content-Type', 'application/json; charset=utf-8'),
+            ('ETag', '"%s"' % etag),
+            ('Cache-Control', 'private, no-cache'),
+        ])
+
+    @http.route('/kb_school_trip/api/changes', type='http', auth='user', methods=['GET'], csrf=False)
+    def changes(self, cursor=None, limit=None, **kwargs):
+        """سجل التغييرات منذ المؤشر"""
+        Change = request.env['school.trip.change']
+        try:
+            Change._decode_cursor(cursor)
+            limit = min(int(limit or MAX_PAGE_SIZE), MAX_CHANGES_PAGE_SIZE)
+        except ValueError:
+            raise BadRequest("Invalid cursor or limit")
+        Change.check_access_rights('read')
+        result = Change._read_since(cursor, limit)
+        return request.make_response(
+            json.dumps(result, ensure_ascii=False, separators=(',', ':')),
+            headers=[('Content-Type', 'application/json; charset=utf-8')],
+        )
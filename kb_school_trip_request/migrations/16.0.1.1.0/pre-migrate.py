@@ -0,0 +1,54 @@
+# migrations/16.0.1.1.0/pre-migrate.py
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    توحيد الربط في event_event.trip_id قبل إضافة القيد الفريد وحذف العمود school_trip_request.event_id.
+    """
+    cr.execute("""
+        SELECT 1 FROM information_schema.columns
+         WHERE table_name = 'school_trip_request' AND column_name = 'event_id'
+    """)
+    if not cr.fetchone():
+        return
+
+    # الروابط الموجودة في طرف الطلب فقط تُنقل إلى طرف الفعالية
+    cr.execute("""
+        UPDATE event_event e
+           SET trip_id = t.id
+          FROM (
+                SELECT DISTINCT ON (event_id) id, event_id
+                  FROM school_trip_request
+                 WHERE event_id IS NOT NULL
+              ORDER BY event_id, id
+          ) t
+         WHERE e.id = t.event_id
+           AND e.trip_id IS NULL
+           AND NOT EXISTS (SELECT 1 FROM event_event o WHERE o.trip_id = t.id)
+    """)
+    _logger.info("Trip link migration: %s one-sided links restored", cr.rowcount)
+
+    # عند تكرار الطلب في أكثر من فعالية نبقي الفعالية التي يشير إليها الطلب، وإلا الأقدم
+    cr.execute("""
+        WITH ranked AS (
+            SELECT e.id,
+                   row_number() OVER (
+                       PARTITION BY e.trip_id
+                       ORDER BY (t.event_id = e.id) DESC NULLS LAST, e.id
+                   ) AS rank
+              FROM event_event e
+              LEFT JOIN school_trip_request t ON t.id = e.trip_id
+             WHERE e.trip_id IS NOT NULL
+        )
+        UPDATE event_event e
+           SET trip_id = NULL
+          FROM ranked
+         WHERE ranked.id = e.id AND ranked.rank > 1
+    """)
+    _logger.info("Trip link migration: %s duplicate links removed", cr.rowcount)
+
+    cr.execute("ALTER TABLE school_trip_request DROP COLUMN event_id")
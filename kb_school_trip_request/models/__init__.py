@@ -1,3 +1,17 @@
 # -*- coding: utf-8 -*-
+from . import school_trip_profile
 from . import school_trip_request
-from . import event_event
\ No newline at end of file
+from . import event_event
+from . import school_trip_sync
+from . import school_trip_note
+from . import fleet_vehicle
+from . import school_trip_allocation
+from . import school_trip_report_batch
+from . import school_trip_analysis
+from . import school_trip_archive
+from . import school_trip_route
+from . import school_trip_capacity
+from . import school_school
+from . import school_trip_change
+from . import school_trip_job
+from . import res_users
@@ -1,8 +1,24 @@
 # models/event_event.py
 # -*- coding: utf-8 -*-
+import logging
+import random
+import time
+
+from psycopg2 import errors
+
 from odoo import models, fields, api
 from odoo.exceptions import ValidationError, UserError
 
+from .school_trip_profile import profiled
+
+_logger = logging.getLogger(__name__)
+
+# حقول الفعالية التي تُنقل إلى طلب الرحلة المرتبط
+TRIP_SYNC_FIELDS = {'date_begin', 'seats_max', 'name', 'address_id'}
+
+# عدد محاولات الربط عند تعارض الأقفال
+LINK_RETRIES = 5
+
 class EventEvent(models.Model):
     _inherit = 'event.event'
 
@@ -13,8 +29,14 @@ class EventEvent(models.Model):
         tracking=True,
         copy=False,
         readonly=True,  # سيتم إنشاؤه تلقائياً
-        ondelete='restrict'
+        ondelete='restrict',
+        index=True
     )
+
+    # ✅ الربط مخزّن في طرف الفعالية فقط، وطلب الرحلة يشتق الفعالية منه
+    _sql_constraints = [
+        ('trip_id_uniq', 'UNIQUE(trip_id)', 'طلب الرحلة مرتبط بالفعل بفعالية أخرى.'),
+    ]
     is_school_trip = fields.Boolean(
         string="رحلة مدرسية", 
         compute="_compute_is_school_trip", 
@@ -29,6 +51,7 @@ class EventEvent(models.Model):
     # Computed Fields
     # ------------------------------------------------------------
     @api.depends('event_type_id')
+    @profiled
     def _compute_is_school_trip(self):
         """تحديد إذا كانت الفعالية رحلة مدرسية بناءً على نوع الفعالية"""
         school_trip_type = self.env.ref(
@@ -39,6 +62,7 @@ class EventEvent(models.Model):
             rec.is_school_trip = (rec.event_type_id == school_trip_type)
     
     @api.depends('is_school_trip', 'trip_id')
+    @profiled
     def _compute_can_create_trip(self):
         """تحديد إمكانية إنشاء طلب رحلة"""
         for rec in self:
@@ -71,6 +95,7 @@ class EventEvent(models.Model):
             'applicant_name': self.env.user.name,
             'applicant_mobile': self.env.user.mobile or self.env.user.phone or '',
             'school_leader_name': 'غير محدد',  # يجب تعبئته لاحقاً
+            'school_ids': [(6, 0, self.env.user.trip_school_ids.ids)],
             'state': 'draft',
         }
         
@@ -78,8 +103,7 @@ class EventEvent(models.Model):
         trip = self.env['school.trip.request'].create(trip_vals)
         
         # ربط طلب الرحلة بالفعالية
-        self.trip_id = trip.id
-        trip.event_id = self.id
+        self._set_trip_links({self.id: trip.id})
         
         # رسالة في السجل
         self.message_post(
@@ -118,121 +142,243 @@ class EventEvent(models.Model):
     # ------------------------------------------------------------
     # CRUD Operations
     # ------------------------------------------------------------
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    @profiled
+    def create(self, vals_list):
         """
-        ✅ عند إنشاء فعالية من نوع رحلة مدرسية، يتم إنشاء طلب رحلة تلقائياً
+        ✅ عند إنشاء فعاليات من نوع رحلة مدرسية، يتم إنشاء طلبات الرحلات تلقائياً دفعة واحدة
         """
-        event = super(EventEvent, self).create(vals)
-        
-        # التحقق من نوع الفعالية
+        events = super(EventEvent, self).create(vals_list)
+        self.env['school.trip.change']._log(
+            self._name, events.filtered('is_school_trip').ids, 'create'
+        )
+
+        # التحقق من نوع الفعالية مرة واحدة لكل استدعاء
         school_trip_type = self.env.ref(
-            'kb_school_trip_request.event_type_school_trip', 
+            'kb_school_trip_request.event_type_school_trip',
             raise_if_not_found=False
         )
-        
-        # إنشاء طلب رحلة تلقائياً إذا كان نوع الفعالية "رحلة مدرسية"
-        if event.event_type_id == school_trip_type and not event.trip_id:
-            trip_vals = {
-                'trip_type': 'activity',
-                'date_from': event.date_begin or fields.Date.today(),
-                'students_count': int(event.seats_max) if event.seats_max else 30,
-                'buses_count': 1,
-                'direction_to': event.address_id.name if event.address_id else 'غير محدد',
-                'trip_purpose': event.name or 'رحلة مدرسية',
-                'stage': 'primary',
-                'applicant_name': event.user_id.name if event.user_id else event.create_uid.name,
-                'applicant_mobile': event.user_id.mobile or event.user_id.phone or '',
-                'school_leader_name': 'غير محدد',
-                'state': 'draft',
-            }
-            
+        if not school_trip_type:
+            return events
+
+        trip_events = events.filtered(
+            lambda event: event.event_type_id == school_trip_type and not event.trip_id
+        )
+        if not trip_events:
+            return events
+
+        # في الوضع غير المتزامن يُؤجل إنشاء الطلبات إلى طابور المهام
+        Job = self.env['school.trip.job']
+        if Job._is_async():
+            Job._enqueue('create_trip', self._name, trip_events.ids)
+        else:
+            trip_events._create_school_trip_requests()
+        return events
+
+    def _prepare_school_trip_vals(self):
+        """
+        قيم طلب الرحلة المنشأ تلقائياً من الفعالية.
+        المدارس من مسؤول الفعالية (أو منشئها) حتى يراه قادة المدارس ضمن نطاقهم.
+        """
+        self.ensure_one()
+        user = self.user_id or self.create_uid
+        return {
+            'trip_type': 'activity',
+            'date_from': self.date_begin or fields.Date.today(),
+            'students_count': int(self.seats_max) if self.seats_max else 30,
+            'buses_count': 1,
+            'direction_to': self.address_id.name if self.address_id else 'غير محدد',
+            'trip_purpose': self.name or 'رحلة مدرسية',
+            'stage': 'primary',
+            'applicant_name': self.user_id.name if self.user_id else self.create_uid.name,
+            'applicant_mobile': self.user_id.mobile or self.user_id.phone or '',
+            'school_leader_name': 'غير محدد',
+            'school_ids': [(6, 0, user.trip_school_ids.ids)],
+            'state': 'draft',
+        }
+
+    @profiled
+    def _create_school_trip_requests(self):
+        """
+        إنشاء طلبات الرحلات لمجموعة فعاليات في استدعاء create واحد، ثم ربطها دفعة واحدة.
+        إذا فشلت الدفعة يُعاد المحاولة لكل فعالية على حدة حتى لا يمنع خطأ واحد بقية الدفعة.
+        """
+        Trip = self.env['school.trip.request']
+        trips_by_event = {}
+        failures = {}
+        vals_list = [event._prepare_school_trip_vals() for event in self]
+        try:
+            with self.env.cr.savepoint():
+                trips = Trip.create(vals_list)
+            trips_by_event = dict(zip(self.ids, trips))
+        except Exception:
+            _logger.info("Batch trip creation failed, retrying event by event", exc_info=True)
+            for event, vals in zip(self, vals_list):
+                try:
+                    with self.env.cr.savepoint():
+                        trips_by_event[event.id] = Trip.create(vals)
+                except Exception as e:
+                    # في حالة فشل إنشاء الطلب، نسجل رسالة فقط ولا نمنع إنشاء الفعالية
+                    failures[event.id] = str(e)
+
+        if trips_by_event:
+            self._set_trip_links({event_id: trip.id for event_id, trip in trips_by_event.items()})
+
+        bodies = {}
+        for event_id, trip in trips_by_event.items():
+            bodies[event_id] = (
+                f"✅ تم إنشاء طلب رحلة تلقائياً: "
+                f"<a href='/web#id={trip.id}&model=school.trip.request'>{trip.name}</a>"
+            )
+        for event_id, error in failures.items():
+            bodies[event_id] = (
+                f"⚠️ تعذر إنشاء طلب الرحلة تلقائياً: {error}<br/>"
+                f"يمكنك إنشاؤه يدوياً باستخدام زر 'إنشاء طلب رحلة'."
+            )
+        self.env['school.trip.note']._log(self, bodies)
+        return trips_by_event
+
+    # ------------------------------------------------------------
+    # Linking
+    # ------------------------------------------------------------
+    @api.model
+    @profiled
+    def _set_trip_links(self, links):
+        """
+        ربط أو فك ربط عدة فعاليات بطلبات الرحلات {event_id: trip_id أو False}.
+        تُقفل الصفوف بترتيب ثابت (الطلبات ثم الفعاليات تصاعدياً) لتجنب الجمود،
+        وتُعاد المحاولة عند تعارض الأقفال مع معاملة أخرى.
+        """
+        if not links:
+            return
+        events = self.browse(list(links))
+        self.flush_model(['trip_id'])
+        for attempt in range(LINK_RETRIES):
             try:
-                trip = self.env['school.trip.request'].create(trip_vals)
-                event.trip_id = trip.id
-                trip.event_id = event.id
-                
-                event.message_post(
-                    body=f"✅ تم إنشاء طلب رحلة تلقائياً: <a href='/web#id={trip.id}&model=school.trip.request'>{trip.name}</a>"
-                )
-            except Exception as e:
-                # في حالة فشل إنشاء الطلب، نسجل رسالة فقط ولا نمنع إنشاء الفعالية
-                event.message_post(
-                    body=f"⚠️ تعذر إنشاء طلب الرحلة تلقائياً: {str(e)}<br/>يمكنك إنشاؤه يدوياً باستخدام زر 'إنشاء طلب رحلة'."
-                )
-        
-        return event
+                with self.env.cr.savepoint():
+                    trip_ids = self._lock_link_rows(events, set(filter(None, links.values())))
+                    self._write_trip_links(links)
+                break
+            except errors.UniqueViolation:
+                raise ValidationError("طلب الرحلة مرتبط بالفعل بفعالية أخرى.")
+            except (errors.LockNotAvailable, errors.DeadlockDetected):
+                if attempt == LINK_RETRIES - 1:
+                    raise UserError("تعذر ربط الفعالية بطلب الرحلة بسبب تعديل متزامن، يرجى المحاولة لاحقاً.")
+                _logger.info("Trip link lock conflict, retrying (attempt %s)", attempt + 1)
+                time.sleep(random.uniform(0.05, 0.1) * 2 ** attempt)
+
+        Trip = self.env['school.trip.request']
+        events.invalidate_recordset(['trip_id'])
+        Trip.invalidate_model(['event_ids', 'event_id'])
+        events.modified(['trip_id'])
+        events._validate_fields(['trip_id'])
+        Change = self.env['school.trip.change']
+        Change._log(self._name, events.ids, 'write')
+        Change._log(Trip._name, trip_ids, 'write')
+
+    def _lock_link_rows(self, events, trip_ids):
+        """قفل الطلبات القديمة والجديدة ثم الفعاليات دون انتظار، وإرجاع معرفات الطلبات"""
+        self.env.cr.execute("""
+            SELECT trip_id FROM event_event WHERE id IN %s AND trip_id IS NOT NULL
+        """, [tuple(events.ids)])
+        trip_ids = sorted(trip_ids.union(row[0] for row in self.env.cr.fetchall()))
+        if trip_ids:
+            self.env.cr.execute("""
+                SELECT id FROM school_trip_request
+                 WHERE id IN %s ORDER BY id FOR UPDATE NOWAIT
+            """, [tuple(trip_ids)])
+        self.env.cr.execute("""
+            SELECT id FROM event_event
+             WHERE id IN %s ORDER BY id FOR UPDATE NOWAIT
+        """, [tuple(events.ids)])
+        return trip_ids
 
+    def _write_trip_links(self, links):
+        """تحديث trip_id لعدة فعاليات بقيم مختلفة في استعلام UPDATE واحد"""
+        values = list(links.items())
+        self.env.cr.execute("""
+            UPDATE event_event AS e
+               SET trip_id = v.trip_id, write_uid = %%s, write_date = now() AT TIME ZONE 'UTC'
+              FROM (VALUES %s) AS v(event_id, trip_id)
+             WHERE e.id = v.event_id
+               AND e.trip_id IS DISTINCT FROM v.trip_id
+        """ % ', '.join(['(%s, %s::int)'] * len(values)),
+            [self.env.uid] + [x for event_id, trip_id in values for x in (event_id, trip_id or None)])
+
+    @profiled
     def write(self, vals):
         """
         تحديث طلب الرحلة المدرسية عند تعديل الفعالية
         """
         result = super(EventEvent, self).write(vals)
-        
-        for event in self:
-            # المزامنة فقط إذا كانت فعالية رحلة مدرسية ومرتبطة بطلب
-            if event.trip_id and event.is_school_trip:
-                trip_vals = {}
-                
-                # مزامنة التاريخ
-                if 'date_begin' in vals and event.date_begin:
-                    trip_vals['date_from'] = event.date_begin
-                
-                # مزامنة عدد الطلاب
-                if 'seats_max' in vals and event.seats_max:
-                    trip_vals['students_count'] = int(event.seats_max)
-                
-                # مزامنة الغرض من الرحلة
-                if 'name' in vals and event.name:
-                    trip_vals['trip_purpose'] = event.name
-                
-                # مزامنة الوجهة
-                if 'address_id' in vals:
-                    if event.address_id:
-                        trip_vals['direction_to'] = event.address_id.name
-                    else:
-                        trip_vals['direction_to'] = 'غير محدد'
-                
-                # تحديث طلب الرحلة إذا كانت هناك تغييرات
-                if trip_vals and event.trip_id.state == 'draft':
-                    # نحدث فقط إذا كان الطلب في حالة مسودة
-                    event.trip_id.write(trip_vals)
-                    event.trip_id.message_post(
-                        body="تم تحديث الطلب تلقائياً من الفعالية المرتبطة."
-                    )
-        
+        self.env['school.trip.change']._log(
+            self._name, self.filtered('is_school_trip').ids, 'write'
+        )
+
+        sync = self.env['school.trip.sync']
+        changed = TRIP_SYNC_FIELDS.intersection(vals)
+        if changed and not sync._is_sync_running():
+            Job = self.env['school.trip.job']
+            if Job._is_async():
+                # شروط المزامنة تُقيّم عند التنفيذ، فتُدمج التعديلات المتكررة في مهمة واحدة
+                Job._enqueue('sync_to_trip', self._name, self.filtered('trip_id').ids, changed)
+                return result
+            # المزامنة فقط إذا كانت فعالية رحلة مدرسية ومرتبطة بطلب في حالة مسودة
+            updates = [
+                (event.trip_id, event._prepare_trip_sync_vals(vals))
+                for event in self
+                if event.trip_id and event.is_school_trip and event.trip_id.state == 'draft'
+            ]
+            sync._propagate(updates, body="تم تحديث الطلب تلقائياً من الفعالية المرتبطة.")
+
         return result
-    
+
+    def _prepare_trip_sync_vals(self, vals):
+        """القيم التي يجب نقلها إلى طلب الرحلة المرتبط"""
+        self.ensure_one()
+        trip_vals = {}
+
+        # مزامنة التاريخ
+        if 'date_begin' in vals and self.date_begin:
+            trip_vals['date_from'] = self.date_begin
+
+        # مزامنة عدد الطلاب
+        if 'seats_max' in vals and self.seats_max:
+            trip_vals['students_count'] = int(self.seats_max)
+
+        # مزامنة الغرض من الرحلة
+        if 'name' in vals and self.name:
+            trip_vals['trip_purpose'] = self.name
+
+        # مزامنة الوجهة
+        if 'address_id' in vals:
+            trip_vals['direction_to'] = self.address_id.name if self.address_id else 'غير محدد'
+
+        return trip_vals
+
+    @profiled
     def unlink(self):
         """التعامل مع طلب الرحلة عند حذف الفعالية"""
-        for event in self:
-            if event.trip_id:
-                # إذا كان طلب الرحلة في حالة مسودة، يمكن حذفه
-                if event.trip_id.state == 'draft':
-                    trip = event.trip_id
-                    event.trip_id = False
-                    trip.unlink()
-                else:
-                    # إذا كان معتمداً، فقط فك الربط
-                    event.trip_id.event_id = False
-                    event.trip_id.message_post(
-                        body=f"تم حذف الفعالية المرتبطة: {event.name}"
-                    )
-        return super(EventEvent, self).unlink()
+        linked = self.filtered('trip_id')
+        trips = linked.trip_id
+        drafts = trips.filtered(lambda trip: trip.state == 'draft')
+        bodies = {
+            event.trip_id.id: f"تم حذف الفعالية المرتبطة: {event.name}"
+            for event in linked if event.trip_id not in drafts
+        }
+        # فك الربط فوراً لأن الحقل يمنع حذف الطلب المرتبط
+        self._set_trip_links(dict.fromkeys(linked.ids, False))
 
-    # ------------------------------------------------------------
-    # Constraints
-    # ------------------------------------------------------------
-    @api.constrains('trip_id')
-    def _check_unique_trip_event(self):
-        """التحقق من عدم ربط نفس طلب الرحلة بأكثر من فعالية"""
-        for rec in self:
-            if rec.trip_id:
-                duplicate = self.search([
-                    ('id', '!=', rec.id),
-                    ('trip_id', '=', rec.trip_id.id)
-                ])
-                if duplicate:
-                    raise ValidationError(
-                        f"طلب الرحلة {rec.trip_id.name} مرتبط بالفعل بفعالية أخرى: {duplicate.name}"
-                    )
\ No newline at end of file
+        Job = self.env['school.trip.job']
+        if Job._is_async():
+            # حذف الطلبات المسودة يُؤجل إلى طابور المهام
+            Job._enqueue('cleanup_trip', trips._name, drafts.ids)
+        else:
+            # إذا كان طلب الرحلة في حالة مسودة يُحذف، وإلا يُكتفى بفك الربط
+            drafts.unlink()
+        self.env['school.trip.note']._log(trips, bodies)
+
+        self.env['school.trip.change']._log(
+            self._name, self.filtered('is_school_trip').ids, 'unlink'
+        )
+        return super(EventEvent, self).unlink()
@@ -0,0 +1,41 @@
+# models/fleet_vehicle.py
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api
+from odoo.osv import expression
+
+
+class FleetVehicle(models.Model):
+    _inherit = 'fleet.vehicle'
+
+    # ✅ حقل بحث فقط: يُستخدم في نطاق اختيار الحافلة لإظهار الحافلات المتاحة في تاريخ الرحلة
+    trip_available_on = fields.Date(
+        string="متاحة بتاريخ",
+        compute="_compute_trip_available_on",
+        search="_search_trip_available_on"
+    )
+
+    def _compute_trip_available_on(self):
+        for rec in self:
+            rec.trip_available_on = False
+
+    def _search_trip_available_on(self, operator, value):
+        """استبعاد الحافلات المحجوزة في التاريخ المطلوب باستعلام فرعي واحد"""
+        if operator != '=' or not value:
+            return expression.TRUE_DOMAIN
+        return [('id', 'not inselect', ("""
+            SELECT l.vehicle_id
+              FROM school_trip_bus_line l
+              JOIN school_trip_request t ON t.id = l.trip_id
+             WHERE t.state != 'cancelled'
+               AND l.date_from = %s
+        """, [value]))]
+
+    @api.model
+    def _get_free_buses(self, date):
+        """الحافلات غير المحجوزة في التاريخ المحدد"""
+        booked = self.env['school.trip.bus.line']._get_availability_map(date, date)
+        booked_ids = booked.get(fields.Date.to_date(date), {}).get('vehicle_ids', set())
+        return self.search([
+            ('vehicle_type', '=', 'bus'),
+            ('id', 'not in', list(booked_ids)),
+        ])
@@ -0,0 +1,23 @@
+# models/res_users.py
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    # ✅ ربط المستخدم بمدارسه: أساس قواعد الوصول للرحلات (جدول الربط مفهرس على school_id)
+    trip_school_ids = fields.Many2many(
+        'school.school',
+        'school_trip_user_school_rel',
+        'user_id',
+        'school_id',
+        string="مدارس الرحلات"
+    )
+
+    def write(self, vals):
+        result = super(ResUsers, self).write(vals)
+        if 'trip_school_ids' in vals:
+            # نطاق القواعد محفوظ في الذاكرة لكل مستخدم، فيجب تحديثه عند تغيير المدارس
+            self.env['ir.rule'].clear_caches()
+        return result
@@ -0,0 +1,27 @@
+# models/school_school.py
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class SchoolSchool(models.Model):
+    _inherit = 'school.school'
+
+    # ✅ علامة تغيير الاسم: تُعالج لاحقاً بمهمة مجدولة على دفعات بدلاً من إعادة حساب كل الرحلات فوراً
+    trip_names_dirty = fields.Boolean(
+        string="أسماء الرحلات بحاجة للتحديث",
+        copy=False,
+        index=True
+    )
+
+    # ✅ موقع المدرسة لتخطيط مسارات الاستلام
+    trip_latitude = fields.Float(string="خط العرض", digits=(10, 7))
+    trip_longitude = fields.Float(string="خط الطول", digits=(10, 7))
+
+    def write(self, vals):
+        """تأجيل تحديث school_names في طلبات الرحلات عند تغيير اسم المدرسة"""
+        if 'name' in vals:
+            vals = dict(vals, trip_names_dirty=True)
+        result = super(SchoolSchool, self).write(vals)
+        if 'name' in vals:
+            self.env.ref('kb_school_trip_request.ir_cron_refresh_school_names')._trigger()
+        return result
@@ -0,0 +1,171 @@
+# models/school_trip_allocation.py
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+from itertools import groupby
+
+from odoo import models, api
+
+
+def _pack_buses(need, pool):
+    """
+    اختيار أقل عدد من الحافلات يغطي عدد الطلاب، ثم أقل هدر في المقاعد.
+
+    حقيبة 0/1 على مجموع المقاعد مع تقسيم ثنائي لكل سعة مقاعد، فالتكلفة
+    تتناسب مع (عدد السعات المختلفة × لوغاريتم عدد الحافلات × عدد الطلاب).
+
+    :param need: عدد الطلاب
+    :param pool: قائمة من (معرف الحافلة، عدد المقاعد)
+    :return: قائمة معرفات الحافلات المختارة أو None إذا لم يكفِ الأسطول
+    """
+    if need <= 0:
+        return []
+    by_seats = defaultdict(list)
+    for vehicle_id, seats in pool:
+        if seats > 0:
+            by_seats[seats].append(vehicle_id)
+    if sum(seats * len(ids) for seats, ids in by_seats.items()) < need:
+        return None
+
+    # الحل الأمثل لا يتجاوز need + أكبر سعة، وإلا أمكن حذف حافلة منه
+    limit = need + max(by_seats)
+    items = []
+    for seats, vehicle_ids in by_seats.items():
+        available, chunk = len(vehicle_ids), 1
+        while available > 0:
+            take = min(chunk, available)
+            items.append((seats, take))
+            available -= take
+            chunk *= 2
+
+    # best[s] = (عدد الحافلات، التركيبة) لأفضل مجموعة مجموع مقاعدها s
+    best = [None] * (limit + 1)
+    best[0] = (0, ())
+    for seats, take in items:
+        weight = seats * take
+        for total in range(limit, weight - 1, -1):
+            previous = best[total - weight]
+            if previous is None:
+                continue
+            count = previous[0] + take
+            if best[total] is None or count < best[total][0]:
+                best[total] = (count, previous[1] + ((seats, take),))
+
+    candidates = [
+        (best[total][0], total - need, total)
+        for total in range(need, limit + 1) if best[total] is not None
+    ]
+    if not candidates:
+        return None
+    _count, _waste, total = min(candidates)
+
+    used = defaultdict(int)
+    for seats, take in best[total][1]:
+        used[seats] += take
+    return [
+        vehicle_id
+        for seats, count in used.items()
+        for vehicle_id in by_seats[seats][:count]
+    ]
+
+
+class SchoolTripRequest(models.Model):
+    _inherit = 'school.trip.request'
+
+    # ------------------------------------------------------------
+    # Bus Allocation
+    # ------------------------------------------------------------
+    def _allocate_buses(self):
+        """
+        توزيع الحافلات المتاحة على الطلبات، يوماً بيوم، بحيث يُقسم الأسطول المشترك
+        على جميع رحلات اليوم في مرور واحد. الطلبات الأكبر تُخدم أولاً.
+
+        :return: الطلبات التي لم يكفِها الأسطول المتاح
+        """
+        trips = self.filtered(
+            lambda trip: trip.state != 'cancelled' and trip.date_from and trip.students_count > 0
+        )
+        if not trips:
+            return self.browse()
+
+        BusLine = self.env['school.trip.bus.line']
+        dates = trips.mapped('date_from')
+        booked = BusLine._get_availability_map(min(dates), max(dates), exclude_trip_ids=trips.ids)
+        buses = self.env['fleet.vehicle'].search([
+            ('vehicle_type', '=', 'bus'),
+            ('seats', '>', 0),
+        ])
+
+        unallocated = self.browse()
+        allocated = self.browse()
+        line_vals_list = []
+        trips_by_count = defaultdict(list)
+        for date, day_trips in groupby(trips.sorted('date_from'), key=lambda trip: trip.date_from):
+            day_trips = self.concat(*day_trips)
+            day_booked = booked.get(date, {})
+            busy_vehicles = day_booked.get('vehicle_ids', set())
+            # حافلات الطلبات وسائقوها الحاليون محجوزون لها حتى يُعاد توزيعها بنجاح،
+            # فالطلب الذي لا يكفيه الأسطول يحتفظ بحافلاته
+            held_vehicles = set(day_trips.bus_line_ids.vehicle_id.ids)
+            busy_drivers = set(day_booked.get('driver_ids', set())) | set(day_trips.bus_line_ids.driver_id.ids)
+            pool = {
+                bus.id: bus for bus in buses
+                if bus.id not in busy_vehicles and bus.id not in held_vehicles
+            }
+
+            for trip in day_trips.sorted(key=lambda trip: trip.students_count, reverse=True):
+                own = {
+                    line.vehicle_id.id: line.vehicle_id for line in trip.bus_line_ids
+                    if line.vehicle_id.seats > 0
+                }
+                candidates = {**pool, **own}
+                chosen = _pack_buses(
+                    trip.students_count,
+                    [(bus.id, bus.seats) for bus in candidates.values()]
+                )
+                if chosen is None:
+                    unallocated |= trip
+                    continue
+                allocated |= trip
+                # الحافلات والسائقون الحاليون للطلب غير المختارين يعودون إلى الأسطول
+                busy_drivers -= set(trip.bus_line_ids.driver_id.ids)
+                for vehicle_id in chosen:
+                    bus = candidates.pop(vehicle_id)
+                    pool.pop(vehicle_id, None)
+                    # السائق الافتراضي للحافلة فقط إذا لم يكن محجوزاً في نفس اليوم
+                    driver = bus.driver_id
+                    if driver and driver.id not in busy_drivers:
+                        busy_drivers.add(driver.id)
+                    else:
+                        driver = driver.browse()
+                    line_vals_list.append({
+                        'trip_id': trip.id,
+                        'vehicle_id': vehicle_id,
+                        'driver_id': driver.id,
+                    })
+                trips_by_count[len(chosen)].append(trip.id)
+                pool.update(candidates)
+
+        # استبدال الحافلات فقط للطلبات التي وُزعت عليها حافلات جديدة
+        allocated.bus_line_ids.unlink()
+        if line_vals_list:
+            BusLine.create(line_vals_list)
+        for count, trip_ids in trips_by_count.items():
+            self.browse(trip_ids).write({'buses_count': count})
+        return unallocated
+
+    @api.model
+    def _allocate_buses_for_date(self, date):
+        """توزيع الحافلات على جميع الطلبات المعتمدة في تاريخ معين"""
+        trips = self.search([('date_from', '=', date), ('state', '=', 'approved')])
+        return trips._allocate_buses()
+
+    def action_allocate_buses(self):
+        """توزيع الحافلات تلقائياً حسب عدد الطلاب ومقاعد الأسطول"""
+        unallocated = self._allocate_buses()
+        if unallocated:
+            return self._notify_user(
+                "توزيع الحافلات",
+                "لا توجد حافلات متاحة كافية للطلبات: %s" % ', '.join(unallocated.mapped('name')),
+                'warning',
+            )
+        return self._notify_user("توزيع الحافلات", "تم توزيع الحافلات بنجاح.", 'success')
@@ -0,0 +1,170 @@
+# models/school_trip_analysis.py
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+
+class SchoolTripAnalysis(models.Model):
+    """
+    جدول تحليلي مادّي: صف لكل (رحلة، مدرسة).
+    القيم موزعة على عدد مدارس الرحلة حتى لا تتكرر الرحلات متعددة المدارس عند الجمع.
+    يُحدَّث تدريجياً بواسطة مهمة مجدولة، فلا تلمس لوحات المتابعة الجداول التشغيلية.
+    """
+    _name = 'school.trip.analysis'
+    _description = 'تحليل طلبات الرحلات المدرسية'
+    _auto = False
+    _order = 'date_from desc'
+
+    trip_id = fields.Many2one('school.trip.request', string="طلب الرحلة", readonly=True)
+    school_id = fields.Many2one('school.school', string="المدرسة", readonly=True)
+    date_from = fields.Date(string="تاريخ الرحلة", readonly=True)
+    date_month = fields.Date(string="الشهر", readonly=True)
+    state = fields.Selection([
+        ('draft', 'مسودة - مقدم الطلب'),
+        ('leader', 'قائد المدرسة'),
+        ('transport', 'مسؤول النقل'),
+        ('approved', 'معتمد نهائياً'),
+        ('cancelled', 'ملغي'),
+    ], string="الحالة", readonly=True)
+    stage = fields.Selection([
+        ('kg', 'روضه'),
+        ('primary', 'الابتدائية'),
+        ('middle', 'المتوسطة'),
+        ('secondary', 'الثانوية'),
+    ], string="المرحلة الدراسية", readonly=True)
+    trip_type = fields.Selection([
+        ('activity', 'رحلة نشاط طلابية'),
+        ('evening', 'دورة مسائية'),
+        ('other', 'أخرى'),
+    ], string="نوع الرحلة", readonly=True)
+    trip_count = fields.Float(string="عدد الرحلات", readonly=True)
+    students_count = fields.Float(string="عدد الطلاب", readonly=True)
+    bus_count = fields.Float(string="عدد الحافلات", readonly=True)
+    seats_total = fields.Float(string="عدد المقاعد", readonly=True)
+    seat_utilization = fields.Float(
+        string="نسبة إشغال المقاعد %",
+        group_operator='avg',
+        readonly=True
+    )
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS school_trip_analysis (
+                id SERIAL PRIMARY KEY,
+                trip_id INTEGER NOT NULL,
+                school_id INTEGER,
+                date_from DATE,
+                date_month DATE,
+                state VARCHAR,
+                stage VARCHAR,
+                trip_type VARCHAR,
+                trip_count DOUBLE PRECISION,
+                students_count DOUBLE PRECISION,
+                bus_count DOUBLE PRECISION,
+                seats_total DOUBLE PRECISION,
+                seat_utilization DOUBLE PRECISION
+            )
+        """)
+        tools.create_index(self._cr, 'school_trip_analysis_trip_id_idx', self._table, ['trip_id'])
+        tools.create_index(
+            self._cr, 'school_trip_analysis_month_school_idx', self._table, ['date_month', 'school_id']
+        )
+
+    # ------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------
+    def _insert_rows(self, trip_ids=None):
+        """إدراج صفوف التحليل لكل الطلبات أو لطلبات محددة"""
+        field = self.env['school.trip.request']._fields['school_ids']
+        where, params = "", {}
+        if trip_ids is not None:
+            where, params = "WHERE t.id = ANY(%(trip_ids)s)", {'trip_ids': list(trip_ids)}
+        line_where = where.replace('t.id', 'trip_id')
+        self.env.cr.execute("""
+            INSERT INTO school_trip_analysis (
+                trip_id, school_id, date_from, date_month, state, stage, trip_type,
+                trip_count, students_count, bus_count, seats_total, seat_utilization
+            )
+            SELECT t.id, s.school_id, t.date_from, date_trunc('month', t.date_from)::date,
+                   t.state, t.stage, t.trip_type,
+                   1.0 / s.school_count,
+                   t.students_count::float / s.school_count,
+                   COALESCE(b.bus_count, 0)::float / s.school_count,
+                   COALESCE(b.seats, 0)::float / s.school_count,
+                   CASE WHEN COALESCE(b.seats, 0) > 0
+                        THEN 100.0 * t.students_count / b.seats ELSE 0 END
+              FROM school_trip_request t
+              CROSS JOIN LATERAL (
+                    SELECT rel.{column2} AS school_id, count(*) OVER () AS school_count
+                      FROM {relation} rel
+                     WHERE rel.{column1} = t.id
+                 UNION ALL
+                    SELECT NULL, 1
+                     WHERE NOT EXISTS (SELECT 1 FROM {relation} rel WHERE rel.{column1} = t.id)
+              ) s
+              LEFT JOIN (
+                    SELECT trip_id, count(*) AS bus_count, SUM(seats) AS seats
+                      FROM school_trip_bus_line
+                      {line_where}
+                  GROUP BY trip_id
+              ) b ON b.trip_id = t.id
+              {where}
+        """.format(
+            relation=field.relation, column1=field.column1, column2=field.column2,
+            where=where, line_where=line_where,
+        ), params)
+
+    @api.model
+    def _refresh(self, full=False):
+        """
+        تحديث الجدول التحليلي تدريجياً حسب write_date منذ آخر تحديث.
+        العلامة المحفوظة هي بداية أقدم معاملة جارية وليست وقت التحديث، لأن معاملة طويلة
+        (مثل الاستيراد) تكتب write_date ببداية المعاملة وقد تنتهي بعد هذا التحديث.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        self.env['school.trip.request'].flush_model()
+        self.env['school.trip.bus.line'].flush_model()
+        refreshed_at = self.env['school.trip.change']._oldest_transaction_start()
+        last_refresh = ICP.get_param('kb_school_trip_request.analysis_refreshed_at')
+
+        if full or not last_refresh:
+            self.env.cr.execute("TRUNCATE school_trip_analysis")
+            self._insert_rows()
+            changed = None
+        else:
+            self.env.cr.execute("""
+                SELECT id FROM school_trip_request
+                 WHERE write_date >= %(since)s
+                 UNION
+                SELECT trip_id FROM school_trip_bus_line
+                 WHERE write_date >= %(since)s
+            """, {'since': last_refresh})
+            changed = [row[0] for row in self.env.cr.fetchall()]
+            # الطلبات المحذوفة تُزال، والمتغيرة يُعاد بناؤها
+            self.env.cr.execute("""
+                DELETE FROM school_trip_analysis a
+                 WHERE a.trip_id = ANY(%s)
+                    OR NOT EXISTS (SELECT 1 FROM school_trip_request t WHERE t.id = a.trip_id)
+            """, [changed])
+            if changed:
+                self._insert_rows(changed)
+
+        ICP.set_param('kb_school_trip_request.analysis_refreshed_at', fields.Datetime.to_string(refreshed_at))
+        self.env.invalidate_all()
+        _logger.info(
+            "Trip analysis refreshed (%s)",
+            "full rebuild" if changed is None else "%s trips" % len(changed),
+        )
+
+    @api.model
+    def _cron_refresh(self):
+        self._refresh()
+
+    @api.model
+    def action_full_refresh(self):
+        """إعادة بناء الجدول التحليلي بالكامل"""
+        self._refresh(full=True)
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
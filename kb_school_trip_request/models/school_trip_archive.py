@@ -0,0 +1,102 @@
+# models/school_trip_archive.py
+# -*- coding: utf-8 -*-
+import logging
+from datetime import date
+
+from odoo import models, fields, api
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+# حجم دفعة الأرشفة والاستعادة والحذف، كل دفعة في معاملة مستقلة
+ARCHIVE_CHUNK_SIZE = 1000
+
+
+class SchoolTripRequest(models.Model):
+    _inherit = 'school.trip.request'
+
+    active = fields.Boolean(string="نشط", default=True)
+
+    # ------------------------------------------------------------
+    # Archival
+    # ------------------------------------------------------------
+    @api.model
+    def _get_academic_cutoff(self, years):
+        """
+        بداية العام الدراسي قبل عدد من الأعوام الدراسية.
+        بداية العام من المعامل kb_school_trip_request.academic_year_start بصيغة MM-DD.
+        """
+        start = self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.academic_year_start', '09-01'
+        )
+        month, day = (int(part) for part in start.split('-'))
+        today = fields.Date.context_today(self)
+        year = today.year if (today.month, today.day) >= (month, day) else today.year - 1
+        return date(year - years, month, day)
+
+    @api.model
+    def _run_in_chunks(self, ids, callback, chunk_size=ARCHIVE_CHUNK_SIZE, commit=False):
+        """
+        تنفيذ العملية على دفعات بحجم ثابت مع تفريغ الذاكرة بينها.
+        الحفظ بعد كل دفعة (commit) للمهام المجدولة فقط؛ الطلبات التفاعلية تبقى معاملة واحدة
+        حتى يُلغى كل شيء عند الخطأ.
+        """
+        for chunk in split_every(chunk_size, ids):
+            callback(self.browse(chunk))
+            if commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        return len(ids)
+
+    @api.model
+    def _archive_old_trips(self, chunk_size=ARCHIVE_CHUNK_SIZE, commit=False):
+        """أرشفة الطلبات السابقة للعام الدراسي المحدد مع حافلاتها، وتبقى روابط الفعاليات كما هي"""
+        years = int(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.archive_after_years', 1
+        ))
+        cutoff = self._get_academic_cutoff(years)
+        ids = self.search([('date_from', '<', cutoff)], order='id').ids
+        count = self._run_in_chunks(ids, lambda trips: trips._set_active(False), chunk_size, commit)
+        _logger.info("Archived %s trips before %s", count, cutoff)
+
+    @api.model
+    def _purge_archived_trips(self, chunk_size=ARCHIVE_CHUNK_SIZE, commit=False):
+        """حذف الطلبات المؤرشفة الأقدم من مدة الحذف (معطل عند القيمة 0)"""
+        years = int(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.purge_after_years', 0
+        ))
+        if years <= 0:
+            return
+        cutoff = self._get_academic_cutoff(years)
+        ids = self.with_context(active_test=False).search(
+            [('active', '=', False), ('date_from', '<', cutoff)], order='id'
+        ).ids
+        # unlink يفك ربط الفعاليات دفعة واحدة قبل الحذف، والحافلات تُحذف بالتتابع
+        count = self._run_in_chunks(ids, lambda trips: trips.unlink(), chunk_size, commit)
+        _logger.info("Purged %s archived trips before %s", count, cutoff)
+
+    @api.model
+    def _cron_archive_trips(self):
+        self._archive_old_trips(commit=True)
+        self._purge_archived_trips(commit=True)
+
+    def _set_active(self, active):
+        """تغيير حالة الأرشفة بعملية write واحدة؛ حقل active في الحافلات مرتبط بالطلب"""
+        self.with_context(tracking_disable=True).write({'active': active})
+
+    def action_restore_archived(self):
+        """استعادة الطلبات المؤرشفة المحددة على دفعات"""
+        ids = self.filtered(lambda rec: not rec.active).ids
+        count = self._run_in_chunks(ids, lambda trips: trips._set_active(True))
+        return self._notify_user("استعادة من الأرشيف", f"تمت استعادة {count} طلب.", 'success')
+
+
+class SchoolTripBusLine(models.Model):
+    _inherit = 'school.trip.bus.line'
+
+    active = fields.Boolean(
+        string="نشط",
+        related="trip_id.active",
+        store=True,
+        readonly=True
+    )
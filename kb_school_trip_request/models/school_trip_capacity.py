@@ -0,0 +1,135 @@
+# models/school_trip_capacity.py
+# -*- coding: utf-8 -*-
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    _logger.debug("numpy not available, trip capacity forecast uses the pure Python fallback")
+    np = None
+
+# الحالات التي تُحتسب ضمن الطلب على المقاعد
+DEMAND_STATES = ('draft', 'leader', 'transport', 'approved')
+
+
+class SchoolTripCapacity(models.AbstractModel):
+    """مقارنة الطلب اليومي على المقاعد والحافلات مع سعة الأسطول"""
+    _name = 'school.trip.capacity'
+    _description = 'توقعات سعة الأسطول للرحلات المدرسية'
+
+    @api.model
+    def _get_supply(self):
+        """سعة الأسطول اليومية: (عدد الحافلات، مجموع المقاعد) باستعلام واحد"""
+        groups = self.env['fleet.vehicle']._read_group(
+            [('vehicle_type', '=', 'bus')], ['seats:sum'], []
+        )
+        if not groups:
+            return 0, 0
+        return groups[0]['__count'], groups[0]['seats'] or 0
+
+    @api.model
+    def _forecast(self, date_start, date_end, states=DEMAND_STATES, extra_trips=None):
+        """
+        الطلب اليومي في الفترة باستعلام مجمّع واحد ومصفوفات يومية.
+
+        :param extra_trips: طلبات تُضاف إلى الطلب حتى لو لم تكن حالتها ضمن states
+        :return: قائمة قاموس لكل يوم: التاريخ، المقاعد والحافلات المطلوبة لكل فئة، السعة، ونسبة الإشغال
+        """
+        date_start = fields.Date.to_date(date_start)
+        date_end = fields.Date.to_date(date_end)
+        days = (date_end - date_start).days + 1
+        if days <= 0:
+            return []
+        self.env['school.trip.request'].flush_model(['date_from', 'state', 'students_count', 'buses_count', 'active'])
+        self.env.cr.execute("""
+            SELECT date_from, state = 'approved', SUM(students_count), SUM(buses_count)
+              FROM school_trip_request
+             WHERE date_from BETWEEN %(start)s AND %(end)s
+               AND active
+               AND (state IN %(states)s OR id IN %(extra)s)
+          GROUP BY date_from, state = 'approved'
+        """, {
+            'start': date_start,
+            'end': date_end,
+            'states': tuple(states),
+            'extra': tuple(extra_trips.ids) if extra_trips else (0,),
+        })
+        rows = self.env.cr.fetchall()
+        bus_supply, seat_supply = self._get_supply()
+
+        if np is not None:
+            seats = np.zeros((2, days), dtype=np.int64)
+            buses = np.zeros((2, days), dtype=np.int64)
+            for date_from, approved, students, bus_count in rows:
+                index = (date_from - date_start).days
+                seats[int(approved), index] += students or 0
+                buses[int(approved), index] += bus_count or 0
+            total_seats = seats.sum(axis=0)
+            total_buses = buses.sum(axis=0)
+            utilization = (100.0 * total_seats / seat_supply) if seat_supply else np.zeros(days)
+            overbooked = (total_seats > seat_supply) | (total_buses > bus_supply)
+            columns = zip(
+                seats[0].tolist(), seats[1].tolist(), total_seats.tolist(),
+                total_buses.tolist(), np.asarray(utilization).tolist(), overbooked.tolist(),
+            )
+        else:
+            seats = [[0] * days, [0] * days]
+            buses = [0] * days
+            for date_from, approved, students, bus_count in rows:
+                index = (date_from - date_start).days
+                seats[int(approved)][index] += students or 0
+                buses[index] += bus_count or 0
+            total_seats = [pending + approved for pending, approved in zip(*seats)]
+            columns = zip(
+                seats[0], seats[1], total_seats, buses,
+                [100.0 * total / seat_supply if seat_supply else 0.0 for total in total_seats],
+                [total > seat_supply or bus_count > bus_supply for total, bus_count in zip(total_seats, buses)],
+            )
+
+        return [{
+            'date': date_start + timedelta(days=index),
+            'pending_seats': pending,
+            'approved_seats': approved,
+            'demand_seats': total,
+            'demand_buses': bus_count,
+            'supply_seats': seat_supply,
+            'supply_buses': bus_supply,
+            'utilization': utilization,
+            'overbooked': overbooked,
+        } for index, (pending, approved, total, bus_count, utilization, overbooked) in enumerate(columns)]
+
+    # ------------------------------------------------------------
+    # Pre-check
+    # ------------------------------------------------------------
+    @api.model
+    def _is_precheck_enabled(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.capacity_precheck', 'False'
+        ))
+
+    @api.model
+    def _precheck(self, trips, states):
+        """
+        منع الانتقال إذا تجاوز الطلب سعة الأسطول في أي يوم من أيام الطلبات.
+        الطلب يشمل الطلبات في states بالإضافة إلى الطلبات المنتقلة نفسها.
+        """
+        if not trips or not self._is_precheck_enabled():
+            return
+        dates = trips.mapped('date_from')
+        forecast = self._forecast(min(dates), max(dates), states=states, extra_trips=trips)
+        trip_dates = set(dates)
+        overbooked = [day for day in forecast if day['overbooked'] and day['date'] in trip_dates]
+        if overbooked:
+            details = ', '.join(
+                f"{day['date']} ({day['demand_seats']}/{day['supply_seats']} مقعد، "
+                f"{day['demand_buses']}/{day['supply_buses']} حافلة)"
+                for day in overbooked
+            )
+            raise UserError(f"سعة الأسطول لا تكفي في الأيام التالية: {details}")
@@ -0,0 +1,156 @@
+# models/school_trip_change.py
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+# حجم دفعة الحذف عند ضغط السجل
+COMPACT_CHUNK_SIZE = 10000
+
+
+class SchoolTripChange(models.Model):
+    """
+    سجل تغييرات خفيف لطلبات الرحلات وحافلاتها وفعاليات الرحلات المدرسية.
+    المؤشر هو (معاملة الكتابة، المعرف): المعرف التسلسلي لا يتبع ترتيب الحفظ، لذلك لا يُقرأ
+    إلا ما كتبته معاملات انتهت وأصبحت مرئية لكل لقطة، فلا يُحفظ بعد المؤشر سطر أقدم منه.
+    """
+    _name = 'school.trip.change'
+    _description = 'سجل تغييرات الرحلات المدرسية'
+    _order = 'id'
+    _log_access = False
+
+    model = fields.Char(string="النموذج", required=True, readonly=True)
+    res_id = fields.Integer(string="معرف السجل", required=True, readonly=True)
+    operation = fields.Selection([
+        ('create', 'إنشاء'),
+        ('write', 'تعديل'),
+        ('unlink', 'حذف'),
+    ], string="العملية", required=True, readonly=True)
+    change_date = fields.Datetime(string="تاريخ التغيير", required=True, readonly=True)
+
+    def init(self):
+        # معرف المعاملة بـ 64 بت (مع الحقبة) فلا يناسبه حقل Integer، ويُدار بـ SQL فقط
+        self._cr.execute("""
+            ALTER TABLE school_trip_change ADD COLUMN IF NOT EXISTS xact_id BIGINT NOT NULL DEFAULT 0
+        """)
+        tools.create_index(
+            self._cr, 'school_trip_change_model_res_id_idx', self._table, ['model', 'res_id', 'id']
+        )
+        tools.create_index(self._cr, 'school_trip_change_xact_id_idx', self._table, ['xact_id', 'id'])
+        tools.create_index(self._cr, 'school_trip_change_date_idx', self._table, ['change_date'])
+
+    @api.model
+    def _log(self, model_name, ids, operation):
+        """تسجيل تغيير مجموعة سجلات بعملية إدراج واحدة"""
+        if not ids:
+            return
+        self.env.cr.execute("""
+            INSERT INTO school_trip_change (model, res_id, operation, change_date, xact_id)
+            SELECT %s, unnest(%s), %s, now() AT TIME ZONE 'UTC', txid_current()
+        """, [model_name, list(ids), operation])
+
+    @api.model
+    def _oldest_transaction_start(self):
+        """
+        بداية أقدم معاملة جارية لمستخدم قاعدة البيانات الحالي (UTC)، ومنها المعاملة الحالية.
+        write_date هو وقت بداية المعاملة، فكل سطر قبل هذا الحد كتبته معاملة انتهت،
+        وأي سطر يُحفظ لاحقاً يحمل write_date بعده.
+        الجلسات الخاملة بلا معاملة لا تؤثر، أما المعاملة الطويلة (أو الجلسة الخاملة داخل معاملة)
+        فتوقف الحد عند بدايتها حتى تنتهي.
+        """
+        self.env.cr.execute("""
+            SELECT COALESCE(min(xact_start), now()) AT TIME ZONE 'UTC'
+              FROM pg_stat_activity
+             WHERE datname = current_database()
+               AND usename = current_user
+               AND state <> 'idle'
+               AND xact_start IS NOT NULL
+        """)
+        return self.env.cr.fetchone()[0]
+
+    @staticmethod
+    def _encode_cursor(xact_id, change_id):
+        return '%s-%s' % (xact_id, change_id)
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        """
+        المؤشر بصيغة xact-id. المؤشر العددي القديم N يعادل (0, N) لأن سطور
+        السجل السابقة لعمود المعاملة محفوظة بالقيمة 0.
+        :raise ValueError: إذا كانت صيغة المؤشر غير صحيحة
+        """
+        cursor = str(cursor or 0)
+        if '-' in cursor:
+            xact_id, change_id = cursor.split('-', 1)
+            return int(xact_id), int(change_id)
+        return 0, int(cursor)
+
+    @api.model
+    def _read_since(self, cursor=0, limit=1000):
+        """
+        كل التغييرات بعد المؤشر، مع المؤشر التالي.
+        الحد الأعلى هو أقدم معاملة ما زالت جارية (txid_snapshot_xmin): كل معاملة قبلها
+        انتهت، وأي معاملة تُحفظ لاحقاً معرفها أكبر منه، فالترتيب على (xact_id, id) لا يتخطى شيئاً.
+        """
+        xact_id, change_id = self._decode_cursor(cursor)
+        self.env.cr.execute("""
+            SELECT id, model, res_id, operation, change_date, xact_id
+              FROM school_trip_change
+             WHERE (xact_id, id) > (%s, %s)
+               AND xact_id < txid_snapshot_xmin(txid_current_snapshot())
+          ORDER BY xact_id, id
+             LIMIT %s
+        """, [xact_id, change_id, limit])
+        changes = [{
+            'cursor': self._encode_cursor(change_xact_id, change_id),
+            'model': model_name,
+            'res_id': res_id,
+            'operation': operation,
+            'date': change_date.isoformat(),
+        } for change_id, model_name, res_id, operation, change_date, change_xact_id in self.env.cr.fetchall()]
+        cursor = self._encode_cursor(xact_id, change_id)
+        return {
+            'changes': changes,
+            'next_cursor': changes[-1]['cursor'] if changes else cursor,
+            'has_more': len(changes) == limit,
+        }
+
+    @api.model
+    def _cron_compact(self):
+        """
+        ضغط السجل على دفعات: الإبقاء على آخر تغيير فقط لكل سجل بعد يوم،
+        وحذف كل ما هو أقدم من مدة الاحتفاظ.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        retention_days = int(ICP.get_param('kb_school_trip_request.change_journal_days', 30))
+        statements = [
+            ("""
+                DELETE FROM school_trip_change
+                 WHERE id IN (
+                    SELECT c.id FROM school_trip_change c
+                     WHERE c.change_date < (now() AT TIME ZONE 'UTC') - interval '1 day'
+                       AND EXISTS (
+                            SELECT 1 FROM school_trip_change n
+                             WHERE n.model = c.model AND n.res_id = c.res_id AND n.id > c.id)
+                     LIMIT %s)
+            """, [COMPACT_CHUNK_SIZE]),
+            ("""
+                DELETE FROM school_trip_change
+                 WHERE id IN (
+                    SELECT id FROM school_trip_change
+                     WHERE change_date < (now() AT TIME ZONE 'UTC') - %s * interval '1 day'
+                     LIMIT %s)
+            """, [retention_days, COMPACT_CHUNK_SIZE]),
+        ]
+        removed = 0
+        for query, params in statements:
+            while True:
+                self.env.cr.execute(query, params)
+                count = self.env.cr.rowcount
+                removed += count
+                self.env.cr.commit()
+                if count < COMPACT_CHUNK_SIZE:
+                    break
+        _logger.info("Trip change journal compacted, %s entries removed", removed)
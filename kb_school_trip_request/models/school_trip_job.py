@@ -0,0 +1,297 @@
+# models/school_trip_job.py
+# -*- coding: utf-8 -*-
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+# عدد المحاولات قبل نقل المهمة إلى حالة "متوقفة"
+MAX_ATTEMPTS = 5
+# مهلة إعادة المحاولة الأولى بالثواني، وتتضاعف مع كل فشل
+RETRY_BACKOFF_SECONDS = 60
+
+
+class SchoolTripJob(models.Model):
+    """
+    طابور المهام المؤجلة للآثار الجانبية بين الفعاليات وطلبات الرحلات.
+    المهام المعلقة لنفس السجل ونفس النوع تُدمج في صف واحد بفضل فهرس فريد جزئي.
+    """
+    _name = 'school.trip.job'
+    _description = 'مهمة مؤجلة للرحلات المدرسية'
+    _order = 'id'
+
+    job_type = fields.Selection([
+        ('create_trip', 'إنشاء طلب رحلة من فعالية'),
+        ('sync_to_trip', 'مزامنة الفعالية إلى الطلب'),
+        ('sync_to_event', 'مزامنة الطلب إلى الفعالية'),
+        ('cleanup_trip', 'حذف طلب مسودة بعد حذف الفعالية'),
+        ('note', 'رسالة في السجل'),
+    ], string="النوع", required=True, readonly=True)
+    model = fields.Char(string="النموذج", required=True, readonly=True)
+    res_id = fields.Integer(string="معرف السجل", required=True, readonly=True)
+    fnames = fields.Char(string="الحقول", readonly=True)
+    payload = fields.Text(string="المحتوى", readonly=True)
+    state = fields.Selection([
+        ('pending', 'معلقة'),
+        ('running', 'قيد التنفيذ'),
+        ('dead', 'متوقفة'),
+    ], string="الحالة", default='pending', required=True, readonly=True)
+    attempts = fields.Integer(string="المحاولات", readonly=True)
+    next_attempt = fields.Datetime(string="المحاولة التالية", readonly=True)
+    last_error = fields.Text(string="آخر خطأ", readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS school_trip_job_pending_uniq
+                ON school_trip_job (job_type, model, res_id)
+             WHERE state = 'pending'
+        """)
+
+    # ------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------
+    @api.model
+    def _is_async(self):
+        """الوضع غير المتزامن اختياري ويُفعّل من معامل النظام"""
+        if self.env.context.get('school_trip_job_running'):
+            return False
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.async_side_effects', 'False'
+        ))
+
+    @api.model
+    def _enqueue(self, job_type, model_name, ids, fnames=(), payloads=None):
+        """
+        إضافة مهام لمجموعة سجلات، مع دمج المهام المعلقة لنفس السجل.
+
+        :param fnames: الحقول المتغيرة (تُدمج مع الحقول المعلقة)
+        :param payloads: {res_id: نص} لمهام الرسائل (تُضاف إلى الرسائل المعلقة)
+        """
+        if not ids:
+            return
+        payloads = payloads or {}
+        fnames = ','.join(sorted(fnames)) or None
+        self._insert_pending([
+            (job_type, model_name, res_id, fnames, payloads.get(res_id), 0, None) for res_id in ids
+        ])
+        self.env.ref('kb_school_trip_request.ir_cron_process_trip_jobs')._trigger()
+
+    @api.model
+    def _insert_pending(self, rows):
+        """
+        إدراج صفوف (النوع، النموذج، السجل، الحقول، المحتوى، المحاولات، المحاولة التالية) بعملية واحدة.
+        الصفوف يجب أن تكون فريدة حسب المفتاح، فـ ON CONFLICT لا يقبل صفين لنفس المفتاح.
+        """
+        job_types, model_names, res_ids, fnames, payloads, attempts, next_attempts = zip(*rows)
+        self.env.cr.execute("""
+            INSERT INTO school_trip_job (
+                job_type, model, res_id, fnames, payload, state, attempts, next_attempt,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT job.job_type, job.model, job.res_id, job.fnames, job.payload, 'pending', job.attempts,
+                   job.next_attempt, %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM unnest(%(job_types)s::varchar[], %(models)s::varchar[], %(res_ids)s::int[],
+                          %(fnames)s::varchar[], %(payloads)s::text[], %(attempts)s::int[],
+                          %(next_attempts)s::timestamp[])
+                   AS job(job_type, model, res_id, fnames, payload, attempts, next_attempt)
+            ON CONFLICT (job_type, model, res_id) WHERE state = 'pending'
+            DO UPDATE SET
+                fnames = (
+                    SELECT string_agg(DISTINCT fname, ',')
+                      FROM unnest(string_to_array(
+                           concat_ws(',', school_trip_job.fnames, EXCLUDED.fnames), ',')) AS fname
+                ),
+                payload = NULLIF(concat_ws('<br/>', school_trip_job.payload, EXCLUDED.payload), ''),
+                attempts = GREATEST(school_trip_job.attempts, EXCLUDED.attempts),
+                next_attempt = GREATEST(school_trip_job.next_attempt, EXCLUDED.next_attempt),
+                write_date = EXCLUDED.write_date
+        """, {
+            'uid': self.env.uid,
+            'job_types': list(job_types),
+            'models': list(model_names),
+            'res_ids': list(res_ids),
+            'fnames': list(fnames),
+            'payloads': list(payloads),
+            'attempts': list(attempts),
+            'next_attempts': list(next_attempts),
+        })
+
+    def _requeue(self, attempts=None, next_attempt=None):
+        """
+        إعادة المهام إلى الطابور مع دمجها في أي مهمة معلقة جديدة لنفس السجل.
+        المهام المكررة لنفس المفتاح (عالقة أو متوقفة) تُدمج أولاً في صف واحد.
+        """
+        if not self:
+            return
+        rows = {}
+        for job in self:
+            key = (job.job_type, job.model, job.res_id)
+            job_attempts = job.attempts if attempts is None else attempts
+            if key not in rows:
+                rows[key] = [job.fnames, job.payload, job_attempts]
+                continue
+            row = rows[key]
+            fnames = set((row[0] or '').split(',')) | set((job.fnames or '').split(','))
+            row[0] = ','.join(sorted(fnames - {''})) or None
+            row[1] = '<br/>'.join(filter(None, [row[1], job.payload])) or None
+            row[2] = max(row[2], job_attempts)
+        self._insert_pending([
+            key + (fnames, payload, job_attempts, next_attempt)
+            for key, (fnames, payload, job_attempts) in rows.items()
+        ])
+        self._mark_done()
+
+    @api.model
+    def _enqueue_notes(self, records, bodies):
+        """تأجيل رسائل السجل {res_id: body}"""
+        self._enqueue('note', records._name, list(bodies), payloads=bodies)
+
+    # ------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------
+    @api.model
+    def _cron_process(self, batch_size=500):
+        """معالجة المهام المعلقة على دفعات، كل دفعة في معاملة مستقلة"""
+        self._recover_stale_jobs()
+        while True:
+            # حجز الدفعة أولاً: أي تحديث جديد لنفس السجل سيُنشئ مهمة معلقة جديدة ولا يضيع
+            self.env.cr.execute("""
+                UPDATE school_trip_job
+                   SET state = 'running', write_date = now() AT TIME ZONE 'UTC'
+                 WHERE id IN (
+                    SELECT id FROM school_trip_job
+                     WHERE state = 'pending'
+                       AND (next_attempt IS NULL OR next_attempt <= now() AT TIME ZONE 'UTC')
+                  ORDER BY id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED)
+             RETURNING id
+            """, [batch_size])
+            job_ids = [row[0] for row in self.env.cr.fetchall()]
+            self.env.cr.commit()
+            if not job_ids:
+                break
+            self.invalidate_model()
+            jobs = self.with_context(school_trip_job_running=True).browse(job_ids)
+            jobs._process_batch()
+            self.env.cr.commit()
+            if len(job_ids) < batch_size:
+                break
+
+    @api.model
+    def _recover_stale_jobs(self):
+        """إعادة المهام العالقة بعد توقف العامل إلى الطابور"""
+        self.env.cr.execute("""
+            SELECT id FROM school_trip_job
+             WHERE state = 'running'
+               AND write_date < (now() AT TIME ZONE 'UTC') - interval '1 hour'
+        """)
+        self.browse([row[0] for row in self.env.cr.fetchall()])._requeue()
+        self.env.cr.commit()
+
+    def _process_batch(self):
+        """تنفيذ المهام مجمعة حسب النوع، مع إعادة المحاولة لكل مهمة منفردة عند الفشل"""
+        for job_type in dict(self._fields['job_type'].selection):
+            jobs = self.filtered(lambda job: job.job_type == job_type)
+            if not jobs:
+                continue
+            try:
+                with self.env.cr.savepoint():
+                    jobs._run()
+                jobs._mark_done()
+            except Exception:
+                _logger.info("Trip job batch '%s' failed, retrying one by one", job_type, exc_info=True)
+                for job in jobs:
+                    try:
+                        with self.env.cr.savepoint():
+                            job._run()
+                        job._mark_done()
+                    except Exception as e:
+                        job._mark_failed(e)
+
+    def _mark_done(self):
+        self.env.cr.execute("DELETE FROM school_trip_job WHERE id IN %s", [tuple(self.ids)])
+        self.invalidate_model()
+
+    def _mark_failed(self, error):
+        """إعادة المحاولة بعد مهلة تتضاعف مع كل فشل، حتى لا تُستنفد المحاولات في نفس الدورة"""
+        attempts = self.attempts + 1
+        _logger.warning("Trip job %s (%s) failed, attempt %s: %s", self.id, self.job_type, attempts, error)
+        self.write({'attempts': attempts, 'last_error': str(error)})
+        if attempts >= MAX_ATTEMPTS:
+            self.state = 'dead'
+        else:
+            next_attempt = fields.Datetime.now() + timedelta(seconds=RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+            self._requeue(next_attempt=next_attempt)
+            self.env.ref('kb_school_trip_request.ir_cron_process_trip_jobs')._trigger(at=next_attempt)
+
+    def action_retry(self):
+        """إعادة المهام المتوقفة إلى الطابور"""
+        self.filtered(lambda job: job.state == 'dead')._requeue(attempts=0)
+        self.env.ref('kb_school_trip_request.ir_cron_process_trip_jobs')._trigger()
+
+    # ------------------------------------------------------------
+    # Handlers
+    # ------------------------------------------------------------
+    def _records(self):
+        """السجلات المستهدفة التي ما زالت موجودة"""
+        return self.env[self[:1].model].browse(self.mapped('res_id')).exists()
+
+    def _fnames_by_record(self):
+        return {job.res_id: set((job.fnames or '').split(',')) - {''} for job in self}
+
+    def _run(self):
+        if self:
+            getattr(self, '_run_%s' % self[:1].job_type)()
+
+    def _run_create_trip(self):
+        school_trip_type = self.env.ref(
+            'kb_school_trip_request.event_type_school_trip', raise_if_not_found=False
+        )
+        # الإنشاء باسم من أضاف الفعالية حتى يكون منشئ الطلب هو المستخدم وليس مستخدم المهمة المجدولة
+        for user in self.create_uid:
+            jobs = self.filtered(lambda job: job.create_uid == user)
+            events = jobs._records().with_user(user).sudo().filtered(
+                lambda event: event.event_type_id == school_trip_type and not event.trip_id
+            )
+            if events:
+                events._create_school_trip_requests()
+
+    def _run_sync_to_trip(self):
+        fnames = self._fnames_by_record()
+        updates = [
+            (event.trip_id, event._prepare_trip_sync_vals(dict.fromkeys(fnames[event.id])))
+            for event in self._records()
+            if event.trip_id and event.is_school_trip and event.trip_id.state == 'draft'
+        ]
+        self.env['school.trip.sync']._propagate(
+            updates, body="تم تحديث الطلب تلقائياً من الفعالية المرتبطة."
+        )
+
+    def _run_sync_to_event(self):
+        fnames = self._fnames_by_record()
+        updates = [
+            (trip.event_id, trip._prepare_event_sync_vals(dict.fromkeys(fnames[trip.id])))
+            for trip in self._records() if trip.event_id
+        ]
+        self.env['school.trip.sync']._propagate(
+            updates, body="تم تحديث الفعالية تلقائياً من طلب الرحلة."
+        )
+
+    def _run_cleanup_trip(self):
+        trips = self._records().filtered(lambda trip: trip.state == 'draft' and not trip.event_id)
+        trips.unlink()
+
+    def _run_note(self):
+        bodies_by_model = defaultdict(dict)
+        for job in self:
+            bodies_by_model[job.model][job.res_id] = job.payload
+        for model_name, bodies in bodies_by_model.items():
+            records = self.env[model_name].browse(list(bodies)).exists()
+            self.env['school.trip.note']._post(
+                records, {res_id: bodies[res_id] for res_id in records.ids}
+            )
@@ -0,0 +1,134 @@
+# models/school_trip_note.py
+# -*- coding: utf-8 -*-
+import logging
+
+from odoo import models, api, tools
+
+_logger = logging.getLogger(__name__)
+
+NOTE_SUBTYPE_XMLID = 'kb_school_trip_request.mt_trip_auto_note'
+
+# أوضاع الرسائل التلقائية:
+#   off: بدون رسائل
+#   coalesce: رسالة واحدة لكل سجل خلال النافذة الزمنية، والرسائل اللاحقة تُضاف إليها
+#   tracking: الاكتفاء بقيم التتبع للحقول المتتبعة
+#   post: رسالة مستقلة لكل حدث
+NOTE_MODES = ('off', 'coalesce', 'tracking', 'post')
+
+# حجم دفعة الحذف عند ضغط الرسائل القديمة (الحذف عبر ORM لتنظيف المرفقات والإشعارات)
+COMPACT_CHUNK_SIZE = 1000
+
+
+class SchoolTripNote(models.AbstractModel):
+    """نقطة مرور واحدة لكل الرسائل التلقائية على طلبات الرحلات والفعاليات"""
+    _name = 'school.trip.note'
+    _description = 'الرسائل التلقائية للرحلات المدرسية'
+
+    @api.model
+    def _mode(self):
+        mode = self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.auto_note_mode', 'coalesce'
+        )
+        return mode if mode in NOTE_MODES else 'coalesce'
+
+    @api.model
+    def _tracking_context(self):
+        """سياق الكتابة: في وضع التتبع تبقى قيم التتبع بديلاً عن الرسائل"""
+        return {} if self._mode() == 'tracking' else {'mail_notrack': True}
+
+    @api.model
+    def _log(self, records, bodies):
+        """
+        تسجيل رسائل تلقائية {res_id: body}، أو تأجيلها إلى طابور المهام في الوضع غير المتزامن.
+        """
+        if not bodies or self._mode() in ('off', 'tracking'):
+            return
+        Job = self.env['school.trip.job']
+        if Job._is_async():
+            Job._enqueue_notes(records, bodies)
+        else:
+            self._post(records, bodies)
+
+    @api.model
+    def _post(self, records, bodies):
+        """كتابة الرسائل حسب الوضع الحالي"""
+        mode = self._mode()
+        if not bodies or mode in ('off', 'tracking'):
+            return
+        records = records.browse(list(bodies))
+        subtype = self.env.ref(NOTE_SUBTYPE_XMLID)
+        if mode == 'coalesce':
+            merged = self._coalesce(records, bodies, subtype)
+            records = records.browse([res_id for res_id in bodies if res_id not in merged])
+        if records:
+            records._message_log_batch(
+                bodies={res_id: bodies[res_id] for res_id in records.ids},
+                subtype_id=subtype.id,
+            )
+
+    def _coalesce(self, records, bodies, subtype):
+        """إضافة النص إلى آخر رسالة تلقائية للسجل داخل النافذة الزمنية، وإرجاع السجلات المدمجة"""
+        window = int(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.auto_note_window', 60
+        ))
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (res_id) res_id, id
+              FROM mail_message
+             WHERE model = %s
+               AND res_id = ANY(%s)
+               AND subtype_id = %s
+               AND author_id = %s
+               AND date > (now() AT TIME ZONE 'UTC') - %s * interval '1 minute'
+          ORDER BY res_id, id DESC
+        """, [records._name, records.ids, subtype.id, self.env.user.partner_id.id, window])
+        messages = dict(self.env.cr.fetchall())
+        if not messages:
+            return set()
+        values = [(message_id, tools.html_sanitize(bodies[res_id])) for res_id, message_id in messages.items()]
+        self.env.cr.execute("""
+            UPDATE mail_message AS m
+               SET body = m.body || '<br/>' || v.body,
+                   write_date = now() AT TIME ZONE 'UTC'
+              FROM (VALUES %s) AS v(id, body)
+             WHERE m.id = v.id
+        """ % ', '.join(['(%s, %s)'] * len(values)), [x for pair in values for x in pair])
+        self.env['mail.message'].browse(list(messages.values())).invalidate_recordset(['body', 'write_date'])
+        return set(messages)
+
+    # ------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------
+    @api.model
+    def _cron_compact_notes(self):
+        """
+        حذف الرسائل التلقائية الأقدم من مدة الاحتفاظ على دفعات مستقلة.
+        المعرفات تُختار بـ SQL والحذف عبر unlink، فتُحذف المرفقات والإشعارات والتمييز بالنجمة
+        وتعمل تجاوزات الوحدات الأخرى.
+        """
+        retention_days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'kb_school_trip_request.auto_note_retention_days', 180
+        ))
+        subtype = self.env.ref(NOTE_SUBTYPE_XMLID, raise_if_not_found=False)
+        if not subtype:
+            return
+        Message = self.env['mail.message'].sudo()
+        removed = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT id FROM mail_message
+                 WHERE subtype_id = %s
+                   AND model IN ('school.trip.request', 'event.event')
+                   AND date < (now() AT TIME ZONE 'UTC') - %s * interval '1 day'
+              ORDER BY id
+                 LIMIT %s
+            """, [subtype.id, retention_days, COMPACT_CHUNK_SIZE])
+            message_ids = [row[0] for row in self.env.cr.fetchall()]
+            if not message_ids:
+                break
+            Message.browse(message_ids).unlink()
+            removed += len(message_ids)
+            self.env.cr.commit()
+            self.env.invalidate_all()
+            if len(message_ids) < COMPACT_CHUNK_SIZE:
+                break
+        _logger.info("Trip automatic notes compacted, %s messages removed", removed)
@@ -0,0 +1,163 @@
+# models/school_trip_profile.py
+# -*- coding: utf-8 -*-
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from odoo import models, fields, api
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+PROFILING_PARAM = 'kb_school_trip_request.profiling'
+
+# حدود فئات المدرج التكراري بالمللي ثانية، والفئة الأخيرة لما فوقها
+PROFILE_BUCKETS = (10, 50, 100, 500, 1000)
+
+# أقل مدة بين تفريغين للذاكرة المؤقتة إلى قاعدة البيانات (ثانية)
+FLUSH_INTERVAL = 60
+
+# ذاكرة القياسات داخل العملية: {(dbname, method): [calls, time, max_time, queries, records, buckets...]}
+_buffer = defaultdict(lambda: [0, 0.0, 0.0, 0, 0] + [0] * (len(PROFILE_BUCKETS) + 1))
+_buffer_lock = threading.Lock()
+_last_flush = {'time': time.monotonic()}
+
+
+def _is_profiling(env):
+    return str2bool(env['ir.config_parameter'].sudo().get_param(PROFILING_PARAM, 'False'))
+
+
+def profiled(method):
+    """
+    قياس زمن الاستدعاء وعدد الاستعلامات وحجم المجموعة عند تفعيل معامل النظام.
+    يوضع مباشرة فوق التعريف وتحت مزخرفات api.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _is_profiling(self.env):
+            return method(self, *args, **kwargs)
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            _record(
+                cr.dbname, '%s.%s' % (self._name, method.__name__),
+                elapsed, cr.sql_log_count - queries, len(self),
+            )
+            if time.monotonic() - _last_flush['time'] > FLUSH_INTERVAL:
+                self.env['school.trip.profile.stat']._flush_buffer()
+    return wrapper
+
+
+def _record(dbname, method, elapsed, queries, records):
+    bucket = next((i for i, limit in enumerate(PROFILE_BUCKETS) if elapsed <= limit), len(PROFILE_BUCKETS))
+    with _buffer_lock:
+        stat = _buffer[(dbname, method)]
+        stat[0] += 1
+        stat[1] += elapsed
+        stat[2] = max(stat[2], elapsed)
+        stat[3] += queries
+        stat[4] += records
+        stat[5 + bucket] += 1
+
+
+class SchoolTripProfileStat(models.Model):
+    """إحصائيات الأداء المجمعة لكل (دالة، ساعة)"""
+    _name = 'school.trip.profile.stat'
+    _description = 'إحصائيات أداء الرحلات المدرسية'
+    _order = 'hour desc, total_time desc'
+
+    method = fields.Char(string="الدالة", required=True, readonly=True)
+    hour = fields.Datetime(string="الساعة", required=True, readonly=True)
+    calls = fields.Integer(string="عدد الاستدعاءات", readonly=True)
+    total_time = fields.Float(string="الزمن الكلي (مللي ثانية)", readonly=True)
+    avg_time = fields.Float(string="متوسط الزمن (مللي ثانية)", group_operator='avg', readonly=True)
+    max_time = fields.Float(string="أقصى زمن (مللي ثانية)", group_operator='max', readonly=True)
+    queries = fields.Integer(string="عدد الاستعلامات", readonly=True)
+    avg_queries = fields.Float(string="متوسط الاستعلامات", group_operator='avg', readonly=True)
+    records = fields.Integer(string="عدد السجلات", readonly=True)
+    bucket_10 = fields.Integer(string="≤ 10ms", readonly=True)
+    bucket_50 = fields.Integer(string="≤ 50ms", readonly=True)
+    bucket_100 = fields.Integer(string="≤ 100ms", readonly=True)
+    bucket_500 = fields.Integer(string="≤ 500ms", readonly=True)
+    bucket_1000 = fields.Integer(string="≤ 1s", readonly=True)
+    bucket_slow = fields.Integer(string="> 1s", readonly=True)
+
+    _sql_constraints = [
+        ('method_hour_uniq', 'UNIQUE(method, hour)', 'إحصائية واحدة لكل دالة في الساعة.'),
+    ]
+
+    @api.model
+    def _flush_buffer(self):
+        """نقل القياسات المجمعة في العملية إلى الجدول بمؤشر مستقل عن معاملة المستخدم"""
+        dbname = self.env.cr.dbname
+        with _buffer_lock:
+            _last_flush['time'] = time.monotonic()
+            stats = {
+                method: _buffer.pop((db, method))
+                for db, method in list(_buffer) if db == dbname
+            }
+        if not stats:
+            return
+        rows = [[method] + values for method, values in stats.items()]
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute("""
+                    INSERT INTO school_trip_profile_stat (
+                        method, hour, calls, total_time, max_time, queries, records,
+                        bucket_10, bucket_50, bucket_100, bucket_500, bucket_1000, bucket_slow,
+                        avg_time, avg_queries,
+                        create_uid, create_date, write_uid, write_date
+                    )
+                    SELECT s.method, date_trunc('hour', now() AT TIME ZONE 'UTC'),
+                           s.calls, s.total_time, s.max_time, s.queries, s.records,
+                           s.b10, s.b50, s.b100, s.b500, s.b1000, s.bslow,
+                           s.total_time / s.calls, s.queries::float / s.calls,
+                           %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+                      FROM unnest(%(methods)s::varchar[], %(calls)s::int[], %(total)s::float[],
+                                  %(max)s::float[], %(queries)s::int[], %(records)s::int[],
+                                  %(b10)s::int[], %(b50)s::int[], %(b100)s::int[],
+                                  %(b500)s::int[], %(b1000)s::int[], %(bslow)s::int[])
+                           AS s(method, calls, total_time, max_time, queries, records,
+                                b10, b50, b100, b500, b1000, bslow)
+                    ON CONFLICT (method, hour) DO UPDATE SET
+                        calls = school_trip_profile_stat.calls + EXCLUDED.calls,
+                        total_time = school_trip_profile_stat.total_time + EXCLUDED.total_time,
+                        max_time = GREATEST(school_trip_profile_stat.max_time, EXCLUDED.max_time),
+                        queries = school_trip_profile_stat.queries + EXCLUDED.queries,
+                        records = school_trip_profile_stat.records + EXCLUDED.records,
+                        bucket_10 = school_trip_profile_stat.bucket_10 + EXCLUDED.bucket_10,
+                        bucket_50 = school_trip_profile_stat.bucket_50 + EXCLUDED.bucket_50,
+                        bucket_100 = school_trip_profile_stat.bucket_100 + EXCLUDED.bucket_100,
+                        bucket_500 = school_trip_profile_stat.bucket_500 + EXCLUDED.bucket_500,
+                        bucket_1000 = school_trip_profile_stat.bucket_1000 + EXCLUDED.bucket_1000,
+                        bucket_slow = school_trip_profile_stat.bucket_slow + EXCLUDED.bucket_slow,
+                        avg_time = (school_trip_profile_stat.total_time + EXCLUDED.total_time)
+                                 / (school_trip_profile_stat.calls + EXCLUDED.calls),
+                        avg_queries = (school_trip_profile_stat.queries + EXCLUDED.queries)::float
+                                    / (school_trip_profile_stat.calls + EXCLUDED.calls),
+                        write_date = EXCLUDED.write_date
+                """, {
+                    'uid': self.env.uid,
+                    **{key: [row[index] for row in rows] for index, key in enumerate((
+                        'methods', 'calls', 'total', 'max', 'queries', 'records',
+                        'b10', 'b50', 'b100', 'b500', 'b1000', 'bslow',
+                    ))},
+                })
+        except Exception:
+            # القياس لا يجب أن يُفشل عملية المستخدم أبداً
+            _logger.warning("Could not flush trip profiling stats", exc_info=True)
+
+    @api.model
+    def _cron_flush(self, retention_days=30):
+        """تفريغ قياسات عملية المهمة المجدولة وحذف الإحصائيات القديمة"""
+        self._flush_buffer()
+        self.env.cr.execute("""
+            DELETE FROM school_trip_profile_stat
+             WHERE hour < (now() AT TIME ZONE 'UTC') - %s * interval '1 day'
+        """, [retention_days])
@@ -0,0 +1,226 @@
+# models/school_trip_report_batch.py
+# -*- coding: utf-8 -*-
+import hashlib
+import logging
+import re
+import time
+
+from odoo import models, fields, api
+from odoo.tools import split_every
+from odoo.tools.pdf import merge_pdf
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+# عدد الطلبات التي تُرسل إلى wkhtmltopdf في كل دفعة عرض
+REPORT_CHUNK_SIZE = 50
+# عدد الطلبات في كل دفعة عند حذف المرفقات القديمة
+ATTACHMENT_GC_CHUNK_SIZE = 1000
+
+
+class SchoolTripRequest(models.Model):
+    _inherit = 'school.trip.request'
+
+    def _get_report_attachment_name(self):
+        """
+        اسم مرفق التقرير المحفوظ: رقم الطلب مع بصمة كل ما يُطبع.
+        الحافلات والسائقون وأسماء المدارس والفعالية لا تغيّر write_date للطلب،
+        لذلك تدخل قيمها المطبوعة في البصمة حتى لا يُعرض ملف قديم.
+        """
+        self.ensure_one()
+        printed = [
+            self.write_date, self.school_names, self.event_id.name,
+            [(line.id, line.vehicle_id.name, line.license_plate, line.seats,
+              line.driver_id.name, line.driver_mobile) for line in self.bus_line_ids],
+        ]
+        digest = hashlib.sha1(repr(printed).encode()).hexdigest()[:16]
+        return '%s-%s.pdf' % (self.name.replace('/', '-'), digest)
+
+    def _unlink_stale_report_attachments(self):
+        """حذف مرفقات التقرير التي حلّ محلها ملف أحدث، والإبقاء على المرفق الحالي فقط"""
+        current = {
+            trip.id: trip._get_report_attachment_name()
+            for trip in self if trip.state == 'approved'
+        }
+        patterns = {
+            trip.id: re.compile(r'%s-[0-9a-f]{14,16}\.pdf' % re.escape(trip.name.replace('/', '-')))
+            for trip in self
+        }
+        attachments = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('name', '=like', '%.pdf'),
+        ])
+        stale = attachments.filtered(
+            lambda attachment: attachment.name != current.get(attachment.res_id)
+            and patterns[attachment.res_id].fullmatch(attachment.name)
+        )
+        stale.unlink()
+        return len(stale)
+
+    @api.model
+    def _cron_unlink_stale_report_attachments(self):
+        """حذف مرفقات التقارير القديمة لكل الطلبات على دفعات مستقلة"""
+        groups = self.env['ir.attachment'].sudo()._read_group(
+            [('res_model', '=', self._name), ('name', '=like', '%.pdf')], ['res_id'], ['res_id']
+        )
+        trip_ids = sorted(group['res_id'] for group in groups if group['res_id'])
+        removed = 0
+        for chunk in split_every(ATTACHMENT_GC_CHUNK_SIZE, trip_ids):
+            removed += self.with_context(active_test=False).browse(chunk).exists()._unlink_stale_report_attachments()
+            self.env.cr.commit()
+            self.env.invalidate_all()
+        _logger.info("Removed %s superseded trip report attachments", removed)
+
+    def _get_cached_report_attachments(self, report):
+        """المرفقات المحفوظة للتقرير لكل طلب (مفتاحها بصمة البيانات المطبوعة) باستعلام واحد"""
+        names = {}
+        for trip in self:
+            name = safe_eval(report.attachment, {'object': trip, 'time': time})
+            if name:
+                names[trip.id] = name
+        if not names:
+            return {}
+        attachments = self.env['ir.attachment'].search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', list(names)),
+            ('name', 'in', list(names.values())),
+        ])
+        return {
+            attachment.res_id: attachment
+            for attachment in attachments
+            if names.get(attachment.res_id) == attachment.name
+        }
+
+    def action_print_batch(self):
+        """طباعة مجمعة للطلبات المعتمدة في الخلفية"""
+        trips = self.filtered(lambda rec: rec.state == 'approved')
+        if not trips:
+            return self._notify_user(
+                "طباعة مجمعة", "لا توجد طلبات معتمدة ضمن التحديد.", 'warning'
+            )
+        batch = self.env['school.trip.report.batch'].create({
+            'trip_ids': [(6, 0, trips.ids)],
+        })
+        self.env.ref('kb_school_trip_request.ir_cron_process_report_batches')._trigger()
+        return self._notify_user(
+            "طباعة مجمعة",
+            f"تمت جدولة {batch.name} لطباعة {len(trips)} طلب، "
+            f"وسيظهر الملف المدمج في قائمة الطباعة المجمعة عند اكتماله.",
+            'info',
+        )
+
+
+class SchoolTripReportBatch(models.Model):
+    _name = 'school.trip.report.batch'
+    _description = 'دفعة طباعة طلبات الرحلات'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string="الدفعة",
+        required=True,
+        readonly=True,
+        default=lambda self: "دفعة طباعة %s" % fields.Datetime.to_string(fields.Datetime.now())
+    )
+    user_id = fields.Many2one(
+        'res.users',
+        string="المستخدم",
+        default=lambda self: self.env.user,
+        readonly=True
+    )
+    trip_ids = fields.Many2many(
+        'school.trip.request',
+        string="طلبات الرحلات",
+        readonly=True
+    )
+    state = fields.Selection([
+        ('queued', 'في الانتظار'),
+        ('running', 'قيد التنفيذ'),
+        ('done', 'مكتملة'),
+        ('failed', 'فشلت'),
+    ], string="الحالة", default='queued', required=True, readonly=True)
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string="الملف المدمج",
+        readonly=True
+    )
+    attachment_data = fields.Binary(
+        string="الملف",
+        related="attachment_id.datas"
+    )
+    attachment_name = fields.Char(
+        related="attachment_id.name"
+    )
+
+    # ✅ مؤشرات الأداء
+    cache_hits = fields.Integer(string="من الذاكرة المؤقتة", readonly=True)
+    cache_misses = fields.Integer(string="تم توليدها", readonly=True)
+    hit_rate = fields.Float(string="نسبة الإصابة %", compute="_compute_hit_rate")
+    render_time = fields.Float(string="زمن التوليد (ثانية)", readonly=True)
+    total_time = fields.Float(string="الزمن الكلي (ثانية)", readonly=True)
+    error = fields.Text(string="الخطأ", readonly=True)
+
+    @api.depends('cache_hits', 'cache_misses')
+    def _compute_hit_rate(self):
+        for rec in self:
+            total = rec.cache_hits + rec.cache_misses
+            rec.hit_rate = 100.0 * rec.cache_hits / total if total else 0.0
+
+    # ------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------
+    @api.model
+    def _cron_process_batches(self, limit=5):
+        """معالجة دفعات الطباعة المنتظرة، كل دفعة في معاملة مستقلة"""
+        batches = self.search([('state', '=', 'queued')], order='id', limit=limit)
+        for batch in batches:
+            batch.state = 'running'
+            self.env.cr.commit()
+            try:
+                batch._process()
+            except Exception as e:
+                self.env.cr.rollback()
+                _logger.exception("Trip report batch %s failed", batch.id)
+                batch.write({'state': 'failed', 'error': str(e)})
+            self.env.cr.commit()
+
+    def _process(self):
+        """توليد المفقود فقط من الذاكرة المؤقتة على دفعات ثم دمج الملفات في PDF واحد"""
+        self.ensure_one()
+        started = time.perf_counter()
+        report = self.env.ref('kb_school_trip_request.action_school_trip_report_pdf')
+        trips = self.trip_ids.filtered(lambda rec: rec.state == 'approved')
+
+        cached = trips._get_cached_report_attachments(report)
+        misses = trips.filtered(lambda rec: rec.id not in cached)
+
+        render_started = time.perf_counter()
+        for chunk in split_every(REPORT_CHUNK_SIZE, misses.ids):
+            # العرض يحفظ مرفقاً لكل طلب معتمد بفضل attachment_use
+            self.env['ir.actions.report']._render_qweb_pdf(report.report_name, res_ids=list(chunk))
+        render_time = time.perf_counter() - render_started
+
+        if misses:
+            cached.update(misses._get_cached_report_attachments(report))
+            misses._unlink_stale_report_attachments()
+        streams = [cached[trip.id].raw for trip in trips if trip.id in cached]
+        attachment = self.env['ir.attachment'].create({
+            'name': f"{self.name}.pdf",
+            'raw': merge_pdf(streams) if streams else b'',
+            'mimetype': 'application/pdf',
+            'res_model': self._name,
+            'res_id': self.id,
+        })
+
+        self.write({
+            'state': 'done',
+            'attachment_id': attachment.id,
+            'cache_hits': len(trips) - len(misses),
+            'cache_misses': len(misses),
+            'render_time': render_time,
+            'total_time': time.perf_counter() - started,
+        })
+        _logger.info(
+            "Trip report batch %s: %s trips, %s cache hits, %s rendered in %.2fs (total %.2fs)",
+            self.id, len(trips), self.cache_hits, self.cache_misses, render_time, self.total_time,
+        )
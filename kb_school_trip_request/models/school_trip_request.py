@@ -1,9 +1,56 @@
 # models/school_trip_request.py
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+import logging
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools import split_every
+from odoo.addons.base.models.ir_sequence import _update_nogap
 from datetime import datetime
 
+from .school_trip_profile import profiled
+
+_logger = logging.getLogger(__name__)
+
+TRIP_SEQUENCE_CODE = 'school.trip.request.sequence'
+
+# انتقالات سير العمل: (الحالات المسموح الانتقال منها، القيم، نص الرسالة)
+TRIP_TRANSITIONS = {
+    'submit': (
+        ('draft',), {'state': 'leader'},
+        "تم إرسال الطلب إلى قائد المدرسة للمراجعة.",
+    ),
+    'leader_approve': (
+        ('leader',), {'state': 'transport'},
+        "تم تحويل الطلب إلى مسؤول النقل للاعتماد النهائي.",
+    ),
+    'approve': (
+        ('transport',), {'state': 'approved', 'transport_approval': True},
+        "✅ تم اعتماد الطلب نهائيًا من مسؤول النقل.",
+    ),
+    'cancel': (
+        ('draft', 'leader', 'transport'), {'state': 'cancelled'},
+        "تم إلغاء الطلب.",
+    ),
+    'reset_to_draft': (
+        ('cancelled',), {'state': 'draft', 'transport_approval': False},
+        "تم إعادة الطلب إلى حالة المسودة.",
+    ),
+}
+
+MOBILE_ERROR = "رقم الجوال يجب أن يبدأ بـ 05 ويتكون من 10 أرقام صحيحة."
+
+
+def is_valid_mobile(mobile):
+    """رقم الجوال يتكون من 10 أرقام ويبدأ بـ 05 (مع تجاهل المسافات والشرطات)."""
+    mobile = mobile.replace(" ", "").replace("-", "")
+    return mobile.isdigit() and len(mobile) == 10 and mobile.startswith('05')
+
+
+# الحقول التي تُنقل من طلب الرحلة إلى الفعالية المرتبطة
+EVENT_SYNC_FIELDS = {'date_from', 'students_count', 'trip_purpose'}
+
+
 class SchoolTripRequest(models.Model):
     _name = 'school.trip.request'
     _description = 'نموذج طلب رحلة مدرسية'
@@ -32,6 +79,7 @@ class SchoolTripRequest(models.Model):
         'school.trip.bus.line',
         'trip_id',
         string="تفاصيل الحافلات",
+        context={'active_test': False},
     )
 
     date_from = fields.Date(string="تاريخ الرحلة", required=True, tracking=True)
@@ -74,24 +122,38 @@ class SchoolTripRequest(models.Model):
         ('cancelled', 'ملغي'),
     ], string="الحالة", default='draft', tracking=True)
 
-    # ✅ حقول الربط مع Event Module
+    # ✅ حقول الربط مع Event Module (الربط مخزّن في event.event.trip_id فقط)
+    event_ids = fields.One2many(
+        'event.event',
+        'trip_id',
+        string="الفعاليات",
+        readonly=True
+    )
     event_id = fields.Many2one(
-        'event.event', 
-        string="الفعالية المرتبطة", 
-        readonly=True, 
-        tracking=True,
-        copy=False,
-        ondelete='restrict'
+        'event.event',
+        string="الفعالية المرتبطة",
+        compute="_compute_event_id",
+        inverse="_inverse_event_id",
+        search="_search_event_id",
+        readonly=True
     )
     event_count = fields.Integer(
         string="عدد الفعاليات", 
         compute="_compute_event_count"
     )
 
+    def init(self):
+        """فهرس الترقيم بالمفتاح (write_date, id) لواجهة التصدير"""
+        tools.create_index(
+            self._cr, 'school_trip_request_write_date_id_idx',
+            self._table, ['write_date', 'id']
+        )
+
     # ------------------------------------------------------------
     # الحقول المحسوبة
     # ------------------------------------------------------------
     @api.depends('date_from')
+    @profiled
     def _compute_day_name(self):
         """تحويل التاريخ إلى اسم اليوم (بالعربية)."""
         days_map = {
@@ -105,20 +167,86 @@ class SchoolTripRequest(models.Model):
                 rec.day_name = days_map.get(day_en, day_en)
     
     @api.depends('school_ids')
+    @profiled
     def _compute_school_names(self):
-        """حساب أسماء المدارس كنص للعرض في التقارير"""
+        """
+        حساب أسماء المدارس كنص للعرض في التقارير.
+        تغيير اسم المدرسة لا يعيد الحساب فوراً، بل يُنقل عبر _cron_refresh_school_names.
+        """
         for rec in self:
             if rec.school_ids:
                 rec.school_names = ', '.join(rec.school_ids.mapped('name'))
             else:
                 rec.school_names = 'غير محدد'
 
+    @api.model
+    def _cron_refresh_school_names(self, chunk_size=1000):
+        """
+        إعادة حساب school_names للرحلات المرتبطة بمدارس تغيّر اسمها، على دفعات مستقلة.
+        علامة كل مدرسة تُمسح فقط بعد حفظ كل رحلاتها، فإذا توقفت المهمة في المنتصف
+        تُستأنف المدارس المتبقية في التشغيل التالي.
+        """
+        self.env.cr.execute("""
+            SELECT id, write_date FROM school_school WHERE trip_names_dirty ORDER BY id
+        """)
+        schools = self.env.cr.fetchall()
+        field = self._fields['school_ids']
+        refreshed = set()
+        for school_id, write_date in schools:
+            self.env.cr.execute(
+                "SELECT {column1} FROM {relation} WHERE {column2} = %s ORDER BY 1".format(
+                    relation=field.relation, column1=field.column1, column2=field.column2,
+                ),
+                [school_id]
+            )
+            # الرحلات المشتركة بين عدة مدارس تُحسب مرة واحدة في التشغيل
+            trip_ids = [row[0] for row in self.env.cr.fetchall() if row[0] not in refreshed]
+            for chunk in split_every(chunk_size, trip_ids):
+                trips = self.browse(chunk)
+                self.env.add_to_compute(self._fields['school_names'], trips)
+                trips.flush_recordset(['school_names'])
+                self.env.cr.commit()
+                self.env.invalidate_all()
+            refreshed.update(trip_ids)
+            # المسح مشروط بعدم تغيّر المدرسة أثناء المعالجة، وإلا تبقى العلامة للتشغيل التالي
+            self.env.cr.execute("""
+                UPDATE school_school SET trip_names_dirty = FALSE
+                 WHERE id = %s AND write_date IS NOT DISTINCT FROM %s
+            """, [school_id, write_date])
+            self.env.cr.commit()
+        if schools:
+            _logger.info("Refreshed school names on %s trips", len(refreshed))
+
+    @api.depends('event_ids')
+    @profiled
+    def _compute_event_id(self):
+        """الفعالية المرتبطة مشتقة من الطرف المخزّن (القيد الفريد يضمن فعالية واحدة)"""
+        for rec in self:
+            rec.event_id = rec.event_ids[:1]
+
+    def _inverse_event_id(self):
+        links = {}
+        for rec in self:
+            for event in rec.event_ids - rec.event_id:
+                links[event.id] = False
+            if rec.event_id:
+                links[rec.event_id.id] = rec.id
+        self.env['event.event']._set_trip_links(links)
+
+    def _search_event_id(self, operator, value):
+        return [('event_ids', operator, value)]
+
+    @profiled
     def _compute_event_count(self):
-        """حساب عدد الفعاليات المرتبطة"""
+        """حساب عدد الفعاليات المرتبطة باستعلام مجمّع واحد لكل المجموعة"""
+        counts = {}
+        if self.ids:
+            groups = self.env['event.event']._read_group(
+                [('trip_id', 'in', self.ids)], ['trip_id'], ['trip_id']
+            )
+            counts = {group['trip_id'][0]: group['trip_id_count'] for group in groups}
         for rec in self:
-            rec.event_count = self.env['event.event'].search_count([
-                ('trip_id', '=', rec.id)
-            ])
+            rec.event_count = counts.get(rec._origin.id, 0)
 
     # ------------------------------------------------------------
     # Actions & Workflows
@@ -141,111 +269,262 @@ class SchoolTripRequest(models.Model):
 
     def action_submit(self):
         """إرسال الطلب إلى قائد المدرسة"""
-        for rec in self:
-            rec.state = 'leader'
-            rec.message_post(body="تم إرسال الطلب إلى قائد المدرسة للمراجعة.")
+        todo, skipped = self._split_by_transition('submit')
+        # نطاق الوصول لقادة المدارس مبني على المدارس، فالطلب بلا مدارس لا يراه أي قائد
+        missing = todo.filtered(lambda rec: not rec.school_ids)
+        (todo - missing)._apply_transition('submit')
+        return self._transition_report(
+            "إرسال إلى قائد المدرسة", skipped | missing,
+            reasons=dict.fromkeys(missing.ids, "لم تُحدد المدارس"),
+        )
 
     def action_leader_approve(self):
         """تحويل الطلب إلى مسؤول النقل"""
-        for rec in self:
-            rec.state = 'transport'
-            rec.message_post(body="تم تحويل الطلب إلى مسؤول النقل للاعتماد النهائي.")
+        todo, skipped = self._split_by_transition('leader_approve')
+        # فحص سريع اختياري: الطلبات المحولة لمسؤول النقل والمعتمدة مع الطلبات الحالية
+        self.env['school.trip.capacity']._precheck(todo, ('transport', 'approved'))
+        todo._apply_transition('leader_approve')
+        return self._transition_report("تحويل لمسؤول النقل", skipped)
 
     def action_approve(self):
         """اعتماد نهائي من مسؤول النقل"""
-        for rec in self:
-            rec.state = 'approved'
-            rec.transport_approval = True
-            rec.message_post(body="✅ تم اعتماد الطلب نهائيًا من مسؤول النقل.")
+        todo, skipped = self._split_by_transition('approve')
+        self.env['school.trip.capacity']._precheck(todo, ('approved',))
+        todo._apply_transition('approve')
+        return self._transition_report("اعتماد نهائي", skipped)
     
     def action_cancel(self):
         """إلغاء الطلب"""
-        for rec in self:
-            # لا نمنع إلغاء الطلب حتى لو كان مرتبطاً بفعالية
-            # لكن نحذف الربط مع الفعالية
-            if rec.event_id:
-                event = rec.event_id
-                rec.event_id = False
-                event.trip_id = False
-                event.message_post(body=f"تم إلغاء طلب الرحلة المرتبط: {rec.name}")
-            
-            rec.state = 'cancelled'
-            rec.message_post(body="تم إلغاء الطلب.")
+        todo, skipped = self._split_by_transition('cancel')
+        # لا نمنع إلغاء الطلب حتى لو كان مرتبطاً بفعالية
+        # لكن نحذف الربط مع الفعالية
+        todo._detach_events("تم إلغاء طلب الرحلة المرتبط: %s")
+        todo._apply_transition('cancel')
+        return self._transition_report("إلغاء الطلب", skipped)
     
     def action_reset_to_draft(self):
         """إعادة الطلب إلى مسودة"""
-        for rec in self:
-            rec.state = 'draft'
-            rec.transport_approval = False
-            rec.message_post(body="تم إعادة الطلب إلى حالة المسودة.")
+        todo, skipped = self._split_by_transition('reset_to_draft')
+        todo._apply_transition('reset_to_draft')
+        return self._transition_report("إعادة للمسودة", skipped)
+
+    def _split_by_transition(self, transition):
+        """فصل الطلبات المسموح لها بالانتقال عن الطلبات التي سيتم تخطيها"""
+        allowed_states = TRIP_TRANSITIONS[transition][0]
+        todo = self.filtered(lambda rec: rec.state in allowed_states)
+        return todo, self - todo
+
+    @profiled
+    def _apply_transition(self, transition):
+        """تطبيق الانتقال على جميع الطلبات بعملية write واحدة ورسائل مجمعة"""
+        if not self:
+            return
+        _allowed_states, vals, body = TRIP_TRANSITIONS[transition]
+        # نص الرسالة يوضح الانتقال، فلا حاجة لرسالة تتبع منفصلة لكل سجل إلا في وضع التتبع
+        Note = self.env['school.trip.note']
+        self.with_context(**Note._tracking_context()).write(vals)
+        Note._log(self, dict.fromkeys(self.ids, body))
+
+    def _transition_report(self, title, skipped, reasons=None):
+        """
+        تقرير بالطلبات التي تم تخطيها وسبب التخطي.
+        :param reasons: أسباب التخطي غير الحالة {معرف الطلب: السبب}، والباقي سببه الحالة
+        """
+        if not skipped:
+            return True
+        reasons = reasons or {}
+        state_labels = dict(self._fields['state']._description_selection(self.env))
+        details = ', '.join(
+            f"{rec.name} ({reasons.get(rec.id) or state_labels.get(rec.state, rec.state)})"
+            for rec in skipped
+        )
+        _logger.info("Trip transition '%s' skipped %s records: %s", title, len(skipped), details)
+        return self._notify_user(
+            title,
+            f"تم تخطي {len(skipped)} طلب لأن حالتها أو بياناتها الحالية لا تسمح بهذا الإجراء: {details}",
+            'warning',
+        )
+
+    @profiled
+    def _detach_events(self, body):
+        """فك الربط مع الفعاليات المرتبطة دفعة واحدة وتسجيل رسالة على كل فعالية"""
+        events = self.event_ids
+        if not events:
+            return
+        bodies = {event.id: body % event.trip_id.name for event in events}
+        events._set_trip_links(dict.fromkeys(events.ids, False))
+        self.env['school.trip.note']._log(events, bodies)
+
+    def _notify_user(self, title, message, notification_type='info'):
+        """إشعار للمستخدم مع إعادة تحميل العرض الحالي"""
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': title,
+                'message': message,
+                'type': notification_type,
+                'sticky': notification_type == 'warning',
+                'next': {'type': 'ir.actions.client', 'tag': 'soft_reload'},
+            },
+        }
 
     # ------------------------------------------------------------
     # CRUD Operations
     # ------------------------------------------------------------
+    @api.model_create_multi
+    @profiled
+    def create(self, vals_list):
+        """توليد أرقام تسلسلية للدفعة كاملة بحجز واحد من التسلسل ثم إدراجها دفعة واحدة."""
+        pending = [vals for vals in vals_list if vals.get('name', 'New') == 'New']
+        if pending:
+            names = self._reserve_sequence_names(len(pending))
+            for vals, name in zip(pending, names):
+                vals['name'] = name
+        trips = super(SchoolTripRequest, self).create(vals_list)
+        self.env['school.trip.change']._log(self._name, trips.ids, 'create')
+        return trips
+
     @api.model
-    def create(self, vals):
-        """توليد رقم تسلسلي تلقائي للطلب."""
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code(
-                'school.trip.request.sequence'
-            ) or 'New'
-        return super(SchoolTripRequest, self).create(vals)
-    
+    @profiled
+    def _reserve_sequence_names(self, count):
+        """حجز كتلة من أرقام TRIP/%(year)s/ في استعلام واحد بدلاً من استدعاء لكل طلب."""
+        IrSequence = self.env['ir.sequence']
+        IrSequence.check_access_rights('read')
+        sequence = IrSequence.search([
+            ('code', '=', TRIP_SEQUENCE_CODE),
+            ('company_id', 'in', [self.env.company.id, False]),
+        ], order='company_id', limit=1)
+        if not sequence:
+            return ['New'] * count
+        if sequence.use_date_range:
+            # التسلسلات المرتبطة بفترات زمنية تحتاج منطق ir.sequence الكامل
+            return [sequence._next() for _i in range(count)]
+
+        if sequence.implementation == 'standard':
+            self.env.cr.execute(
+                "SELECT nextval(%s) FROM generate_series(1, %s)",
+                ['ir_sequence_%03d' % sequence.id, count]
+            )
+            numbers = sorted(row[0] for row in self.env.cr.fetchall())
+        else:
+            first = _update_nogap(sequence, sequence.number_increment * count)
+            numbers = [first + i * sequence.number_increment for i in range(count)]
+
+        prefix, suffix = sequence._get_prefix_suffix()
+        number_format = '%%0%sd' % sequence.padding
+        return [prefix + number_format % number + suffix for number in numbers]
+
+    @profiled
     def write(self, vals):
         """مزامنة التغييرات مع الفعالية المرتبطة"""
         result = super(SchoolTripRequest, self).write(vals)
-        
+        self.env['school.trip.change']._log(self._name, self.ids, 'write')
+
         # مزامنة مع الفعالية إذا وجدت
-        for rec in self:
-            if rec.event_id:
-                event_vals = {}
-                
-                if 'date_from' in vals:
-                    event_vals.update({
-                        'date_begin': rec.date_from,
-                        'date_end': rec.date_from,
-                    })
-                
-                if 'students_count' in vals:
-                    event_vals['seats_max'] = rec.students_count
-                
-                if 'trip_purpose' in vals:
-                    event_vals['name'] = rec.trip_purpose
-                
-                if event_vals:
-                    rec.event_id.write(event_vals)
-                    rec.event_id.message_post(body="تم تحديث الفعالية تلقائياً من طلب الرحلة.")
-        
+        sync = self.env['school.trip.sync']
+        changed = EVENT_SYNC_FIELDS.intersection(vals)
+        if changed and not sync._is_sync_running():
+            Job = self.env['school.trip.job']
+            if Job._is_async():
+                Job._enqueue('sync_to_event', self._name, self.filtered('event_id').ids, changed)
+                return result
+            updates = [
+                (rec.event_id, rec._prepare_event_sync_vals(vals))
+                for rec in self if rec.event_id
+            ]
+            sync._propagate(updates, body="تم تحديث الفعالية تلقائياً من طلب الرحلة.")
+
         return result
-    
+
+    def _prepare_event_sync_vals(self, vals):
+        """القيم التي يجب نقلها إلى الفعالية المرتبطة"""
+        self.ensure_one()
+        event_vals = {}
+        if 'date_from' in vals:
+            event_vals.update({
+                'date_begin': self.date_from,
+                'date_end': self.date_from,
+            })
+        if 'students_count' in vals:
+            event_vals['seats_max'] = self.students_count
+        if 'trip_purpose' in vals:
+            event_vals['name'] = self.trip_purpose
+        return event_vals
+
+    @profiled
     def unlink(self):
         """التعامل مع الفعالية المرتبطة عند حذف الطلب"""
-        for rec in self:
-            if rec.event_id:
-                # فك الربط فقط، لا نحذف الفعالية
-                event = rec.event_id
-                rec.event_id = False
-                event.trip_id = False
-                event.message_post(
-                    body=f"تم حذف طلب الرحلة المرتبط: {rec.name}"
-                )
+        # فك الربط فقط، لا نحذف الفعالية
+        self._detach_events("تم حذف طلب الرحلة المرتبط: %s")
+        Change = self.env['school.trip.change']
+        Change._log(self._name, self.ids, 'unlink')
+        # الحافلات تُحذف بالتتابع في قاعدة البيانات دون المرور بـ unlink الخاص بها
+        Change._log('school.trip.bus.line', self.with_context(active_test=False).bus_line_ids.ids, 'unlink')
         return super(SchoolTripRequest, self).unlink()
 
+    def _touch_write_date(self):
+        """
+        تحديث write_date فقط بعد حذف حافلات الطلب، حتى يلتقط التحديث التدريجي
+        للتحليل وواجهة التصدير الطلب المتغير.
+        """
+        trips = self.exists()
+        if not trips:
+            return
+        self.env.cr.execute(
+            "UPDATE school_trip_request SET write_date = %s, write_uid = %s WHERE id IN %s",
+            [self.env.cr.now(), self.env.uid, tuple(trips.ids)]
+        )
+        trips.invalidate_recordset(['write_date', 'write_uid'])
+
+    # ------------------------------------------------------------
+    # Dispatch Export
+    # ------------------------------------------------------------
+    def _get_dispatch_payload(self):
+        """
+        بيانات الطلبات وحافلاتها بصيغة مختصرة لنظام تشغيل النقل.
+        جميع أسطر الحافلات للصفحة تُجلب باستعلام واحد.
+        """
+        trip_fields = [
+            'name', 'date_from', 'students_count', 'buses_count', 'school_names',
+            'direction_from', 'direction_to', 'trip_purpose', 'stage', 'write_date',
+        ]
+        trips = self.read(trip_fields, load=None)
+        lines = self.env['school.trip.bus.line'].search_read(
+            [('trip_id', 'in', self.ids)],
+            ['trip_id', 'vehicle_id', 'driver_id', 'license_plate', 'seats', 'driver_mobile'],
+            order='trip_id, id'
+        )
+        lines_by_trip = {}
+        for line in lines:
+            lines_by_trip.setdefault(line['trip_id'][0], []).append({
+                'vehicle_id': line['vehicle_id'] and line['vehicle_id'][0],
+                'vehicle': line['vehicle_id'] and line['vehicle_id'][1],
+                'plate': line['license_plate'] or None,
+                'seats': line['seats'],
+                'driver_id': line['driver_id'] and line['driver_id'][0],
+                'driver': line['driver_id'] and line['driver_id'][1],
+                'driver_mobile': line['driver_mobile'] or None,
+            })
+        for trip in trips:
+            trip['write_date'] = trip['write_date'].isoformat()
+            trip['date_from'] = fields.Date.to_string(trip['date_from'])
+            trip['bus_lines'] = lines_by_trip.get(trip['id'], [])
+        return trips
+
     # ------------------------------------------------------------
     # Constraints
     # ------------------------------------------------------------
     @api.constrains('applicant_mobile')
+    @profiled
     def _check_applicant_mobile(self):
         """التحقق من أن رقم الجوال يتكون من 10 أرقام ويبدأ بـ 05."""
         for rec in self:
-            if rec.applicant_mobile:
-                mobile = rec.applicant_mobile.replace(" ", "").replace("-", "")
-                if not (mobile.isdigit() and len(mobile) == 10 and mobile.startswith('05')):
-                    raise ValidationError(
-                        "رقم الجوال يجب أن يبدأ بـ 05 ويتكون من 10 أرقام صحيحة."
-                    )
+            if rec.applicant_mobile and not is_valid_mobile(rec.applicant_mobile):
+                raise ValidationError(MOBILE_ERROR)
     
     @api.constrains('students_count', 'buses_count')
+    @profiled
     def _check_positive_numbers(self):
         """التحقق من أن الأعداد موجبة"""
         for rec in self:
@@ -254,6 +533,15 @@ class SchoolTripRequest(models.Model):
             if rec.buses_count <= 0:
                 raise ValidationError("عدد الحافلات يجب أن يكون أكبر من صفر.")
 
+    @api.constrains('state', 'date_from')
+    @profiled
+    def _check_bus_availability(self):
+        """
+        إعادة التحقق من توفر الحافلات عند إعادة تفعيل طلب ملغي أو تغيير تاريخه.
+        تاريخ أسطر الحافلات حقل مرتبط مخزن، وإعادة حسابه لا تُشغّل قيود الأسطر.
+        """
+        self.filtered(lambda rec: rec.state != 'cancelled').bus_line_ids._check_unique_vehicle()
+
 
 class SchoolTripBusLine(models.Model):
     _name = 'school.trip.bus.line'
@@ -263,7 +551,8 @@ class SchoolTripBusLine(models.Model):
         'school.trip.request', 
         string="الرحلة", 
         ondelete='cascade',
-        required=True
+        required=True,
+        index=True
     )
 
     vehicle_id = fields.Many2one(
@@ -276,6 +565,13 @@ class SchoolTripBusLine(models.Model):
         'res.partner', 
         string="السائق"
     )
+    date_from = fields.Date(
+        string="تاريخ الرحلة",
+        related="trip_id.date_from",
+        store=True,
+        readonly=True,
+        index=True
+    )
     driver_mobile = fields.Char(
         string="جوال السائق", 
         related="driver_id.mobile", 
@@ -294,24 +590,139 @@ class SchoolTripBusLine(models.Model):
         store=True, 
         readonly=True
     )
+    trip_state = fields.Selection(
+        string="حالة الرحلة",
+        related="trip_id.state",
+        store=True,
+        readonly=True
+    )
     notes = fields.Text(string="ملاحظات")
 
+    def init(self):
+        """فهارس الحجز حسب (الحافلة، التاريخ) و(السائق، التاريخ)"""
+        tools.create_index(
+            self._cr, 'school_trip_bus_line_vehicle_date_idx',
+            self._table, ['vehicle_id', 'date_from']
+        )
+        tools.create_index(
+            self._cr, 'school_trip_bus_line_driver_date_idx',
+            self._table, ['driver_id', 'date_from'], where='driver_id IS NOT NULL'
+        )
+
+    def name_get(self):
+        """اسم الحجز في التقويم: الحافلة - الرحلة (قراءة مجمعة عبر الجلب المسبق)"""
+        return [(line.id, f"{line.vehicle_id.name} - {line.trip_id.name}") for line in self]
+
     @api.onchange('vehicle_id')
     def _onchange_vehicle_id(self):
         """عند اختيار المركبة، يتم تعبئة السائق تلقائيًا"""
         if self.vehicle_id and self.vehicle_id.driver_id:
             self.driver_id = self.vehicle_id.driver_id
-    
-    @api.constrains('vehicle_id', 'trip_id')
+
+    # ------------------------------------------------------------
+    # CRUD Operations
+    # ------------------------------------------------------------
+    @api.model_create_multi
+    @profiled
+    def create(self, vals_list):
+        lines = super(SchoolTripBusLine, self).create(vals_list)
+        self.env['school.trip.change']._log(self._name, lines.ids, 'create')
+        return lines
+
+    @profiled
+    def write(self, vals):
+        result = super(SchoolTripBusLine, self).write(vals)
+        self.env['school.trip.change']._log(self._name, self.ids, 'write')
+        return result
+
+    @profiled
+    def unlink(self):
+        self.env['school.trip.change']._log(self._name, self.ids, 'unlink')
+        trips = self.trip_id
+        result = super(SchoolTripBusLine, self).unlink()
+        trips._touch_write_date()
+        return result
+
+    # ------------------------------------------------------------
+    # Availability
+    # ------------------------------------------------------------
+    @api.model
+    def _get_availability_map(self, date_start, date_end, exclude_trip_ids=()):
+        """
+        خريطة الحجوزات لكل يوم في الفترة باستعلام واحد:
+        {date: {'vehicle_ids': set(), 'driver_ids': set()}}
+        """
+        self.flush_model(['trip_id', 'vehicle_id', 'driver_id', 'date_from'])
+        self.env['school.trip.request'].flush_model(['state'])
+        self.env.cr.execute("""
+            SELECT l.date_from,
+                   array_agg(DISTINCT l.vehicle_id),
+                   array_remove(array_agg(DISTINCT l.driver_id), NULL)
+              FROM school_trip_bus_line l
+              JOIN school_trip_request t ON t.id = l.trip_id
+             WHERE t.state != 'cancelled'
+               AND l.date_from BETWEEN %s AND %s
+               AND NOT (l.trip_id = ANY(%s))
+          GROUP BY l.date_from
+        """, [date_start, date_end, list(exclude_trip_ids)])
+        return {
+            date: {'vehicle_ids': set(vehicle_ids), 'driver_ids': set(driver_ids)}
+            for date, vehicle_ids, driver_ids in self.env.cr.fetchall()
+        }
+
+    def _get_booking_conflicts(self):
+        """
+        البحث عن الحجوزات المتعارضة للأسطر الحالية باستعلام واحد.
+        يُرجع قائمة من (نوع المورد، معرف المورد، التاريخ، معرفات الأسطر).
+        """
+        if not self.ids:
+            return []
+        self.flush_model(['trip_id', 'vehicle_id', 'driver_id', 'date_from'])
+        self.env['school.trip.request'].flush_model(['state'])
+        self.env.cr.execute("""
+            WITH batch AS (
+                SELECT DISTINCT vehicle_id, driver_id, date_from
+                  FROM school_trip_bus_line
+                 WHERE id IN %(ids)s
+            )
+            SELECT 'vehicle', l.vehicle_id, l.date_from, array_agg(l.id ORDER BY l.id)
+              FROM school_trip_bus_line l
+              JOIN school_trip_request t ON t.id = l.trip_id
+             WHERE t.state != 'cancelled'
+               AND (l.vehicle_id, l.date_from) IN (SELECT vehicle_id, date_from FROM batch)
+          GROUP BY l.vehicle_id, l.date_from
+            HAVING count(*) > 1
+         UNION ALL
+            SELECT 'driver', l.driver_id, l.date_from, array_agg(l.id ORDER BY l.id)
+              FROM school_trip_bus_line l
+              JOIN school_trip_request t ON t.id = l.trip_id
+             WHERE t.state != 'cancelled'
+               AND (l.driver_id, l.date_from) IN (
+                    SELECT driver_id, date_from FROM batch WHERE driver_id IS NOT NULL)
+          GROUP BY l.driver_id, l.date_from
+            HAVING count(*) > 1
+        """, {'ids': tuple(self.ids)})
+        return self.env.cr.fetchall()
+
+    @api.constrains('vehicle_id', 'driver_id', 'trip_id', 'date_from')
+    @profiled
     def _check_unique_vehicle(self):
-        """التحقق من عدم تكرار نفس الحافلة في نفس الرحلة"""
-        for rec in self:
-            duplicate = self.search([
-                ('id', '!=', rec.id),
-                ('trip_id', '=', rec.trip_id.id),
-                ('vehicle_id', '=', rec.vehicle_id.id)
-            ])
-            if duplicate:
+        """التحقق من عدم حجز نفس الحافلة أو السائق في أكثر من رحلة في نفس اليوم"""
+        for resource, resource_id, date, line_ids in self._get_booking_conflicts():
+            lines = self.browse(line_ids)
+            trips = lines.trip_id
+            if resource == 'vehicle':
+                vehicle = self.env['fleet.vehicle'].browse(resource_id)
+                if len(trips) == 1:
+                    raise ValidationError(
+                        f"الحافلة {vehicle.name} مضافة بالفعل لهذه الرحلة."
+                    )
                 raise ValidationError(
-                    f"الحافلة {rec.vehicle_id.name} مضافة بالفعل لهذه الرحلة."
-                )
\ No newline at end of file
+                    f"الحافلة {vehicle.name} محجوزة بتاريخ {date} في أكثر من رحلة: "
+                    f"{', '.join(trips.mapped('name'))}"
+                )
+            driver = self.env['res.partner'].browse(resource_id)
+            raise ValidationError(
+                f"السائق {driver.name} مرتبط بأكثر من حافلة بتاريخ {date}: "
+                f"{', '.join(trips.mapped('name'))}"
+            )
@@ -0,0 +1,242 @@
+# models/school_trip_route.py
+# -*- coding: utf-8 -*-
+import logging
+import math
+import threading
+from collections import OrderedDict, defaultdict
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    _logger.debug("numpy not available, trip route distances use the pure Python fallback")
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+
+# ذاكرة LRU للمسافات داخل العملية لكل زوج مواقع: {(point, point): km}
+# مشتركة بين خيوط العامل، فكل وصول إليها تحت القفل
+_distance_cache = OrderedDict()
+_distance_cache_lock = threading.Lock()
+DISTANCE_CACHE_LIMIT = 200000
+
+
+def _point(latitude, longitude):
+    """مفتاح الموقع بدقة ست خانات عشرية (حوالي عشرة سنتيمترات)"""
+    if not latitude and not longitude:
+        return None
+    return (round(latitude, 6), round(longitude, 6))
+
+
+def _haversine(pairs):
+    """مسافات الدائرة العظمى (كم) لقائمة أزواج ((lat, lon), (lat, lon)) باستدعاء واحد"""
+    if np is not None:
+        coords = np.radians(np.array([a + b for a, b in pairs], dtype=float))
+        lat1, lon1, lat2, lon2 = coords.T
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))).tolist()
+    distances = []
+    for (lat1, lon1), (lat2, lon2) in pairs:
+        lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+        h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h)))
+    return distances
+
+
+def _get_distances(pairs):
+    """
+    مسافات كل الأزواج المطلوبة كقاموس محلي للتخطيط الحالي.
+    الناقص يُحسب دفعة واحدة، ثم يُضاف إلى الذاكرة المشتركة مع إخراج الأقدم استخداماً؛
+    الإخراج لا يمس القاموس المحلي، فلا تضيع أزواج يحتاجها التخطيط الجاري.
+    """
+    needed = {(a, b) for a, b in pairs if a != b}
+    distances = {}
+    with _distance_cache_lock:
+        for pair in needed:
+            km = _distance_cache.get(pair)
+            if km is not None:
+                _distance_cache.move_to_end(pair)
+                distances[pair] = km
+    missing = list(needed - set(distances))
+    if missing:
+        computed = dict(zip(missing, _haversine(missing)))
+        distances.update(computed)
+        with _distance_cache_lock:
+            _distance_cache.update(computed)
+            while len(_distance_cache) > DISTANCE_CACHE_LIMIT:
+                _distance_cache.popitem(last=False)
+    return distances
+
+
+def _distance(distances, a, b):
+    if a is None or b is None or a == b:
+        return 0.0
+    return distances[(a, b)]
+
+
+def _plan_path(points, end, distances):
+    """
+    ترتيب نقاط الاستلام بأقرب جار ثم تحسين 2-opt، مع تثبيت الوجهة في نهاية المسار.
+    :return: (الترتيب كفهارس، المسافة)
+    """
+    count = len(points)
+    if not count:
+        return [], 0.0
+    # البداية من أبعد نقطة عن الوجهة، ثم أقرب نقطة غير مزارة في كل خطوة
+    start = max(range(count), key=lambda i: _distance(distances, points[i], end))
+    order, remaining = [start], set(range(count)) - {start}
+    while remaining:
+        last = points[order[-1]]
+        nearest = min(remaining, key=lambda i: _distance(distances, last, points[i]))
+        order.append(nearest)
+        remaining.discard(nearest)
+
+    def node(position):
+        return points[order[position]] if position < count else end
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(count - 1):
+            for j in range(i + 1, count):
+                before = node(i - 1) if i else None
+                delta = (
+                    (_distance(distances, before, node(j)) - _distance(distances, before, node(i)) if i else 0.0)
+                    + _distance(distances, node(i), node(j + 1)) - _distance(distances, node(j), node(j + 1))
+                )
+                if delta < -1e-9:
+                    order[i:j + 1] = reversed(order[i:j + 1])
+                    improved = True
+    length = sum(_distance(distances, node(k), node(k + 1)) for k in range(count))
+    return order, length
+
+
+class SchoolTripRequest(models.Model):
+    _inherit = 'school.trip.request'
+
+    destination_latitude = fields.Float(string="خط عرض الوجهة", digits=(10, 7))
+    destination_longitude = fields.Float(string="خط طول الوجهة", digits=(10, 7))
+    route_distance = fields.Float(
+        string="مسافة المسارات (كم)",
+        compute="_compute_route_distance",
+        store=True,
+        digits=(16, 1)
+    )
+    unrouted_school_names = fields.Char(
+        string="مدارس بلا إحداثيات",
+        readonly=True,
+        help="مدارس الطلب التي لم تدخل في مسارات الحافلات لعدم وجود إحداثياتها"
+    )
+
+    @api.depends('bus_line_ids.route_distance')
+    def _compute_route_distance(self):
+        for rec in self:
+            rec.route_distance = sum(rec.bus_line_ids.mapped('route_distance'))
+
+    # ------------------------------------------------------------
+    # Route Planning
+    # ------------------------------------------------------------
+    def _plan_routes(self):
+        """
+        تخطيط مسارات الاستلام لمجموعة طلبات دفعة واحدة:
+        حساب كل المسافات الناقصة بعملية متجهة واحدة، ثم ترتيب المدارس وتوزيعها على الحافلات.
+        المدارس بلا إحداثيات لا تُضاف لأي مسار، بل تُذكر في unrouted_school_names لتوزيعها يدوياً.
+        """
+        trips = self.filtered(lambda rec: rec.state != 'cancelled' and rec.bus_line_ids)
+        plans = {}
+        pairs = []
+        for trip in trips:
+            schools = trip.school_ids
+            points = {school.id: _point(school.trip_latitude, school.trip_longitude) for school in schools}
+            located = schools.filtered(lambda school: points[school.id])
+            end = _point(trip.destination_latitude, trip.destination_longitude)
+            stops = [points[school.id] for school in located] + ([end] if end else [])
+            pairs.extend((a, b) for a in stops for b in stops if a != b)
+            plans[trip] = (located, schools - located, end)
+        distances = _get_distances(pairs)
+
+        line_vals = defaultdict(list)
+        trip_vals = defaultdict(list)
+        for trip, (located, unlocated, end) in plans.items():
+            trip_vals[', '.join(unlocated.mapped('name'))].append(trip.id)
+            order, _length = _plan_path(
+                [_point(school.trip_latitude, school.trip_longitude) for school in located], end, distances
+            )
+            ordered = [located[i] for i in order]
+            lines = trip.bus_line_ids.sorted('id')
+            for line, chunk in zip(lines, self._split_route(ordered, len(lines))):
+                chunk_order, distance = _plan_path(
+                    [_point(school.trip_latitude, school.trip_longitude) for school in chunk], end, distances
+                )
+                pickup_order = ' ← '.join(chunk[i].name for i in chunk_order)
+                line_vals[(pickup_order, round(distance, 1))].append(line.id)
+
+        BusLine = self.env['school.trip.bus.line'].with_context(tracking_disable=True)
+        for (pickup_order, distance), line_ids in line_vals.items():
+            BusLine.browse(line_ids).write({
+                'pickup_order': pickup_order or False,
+                'route_distance': distance,
+            })
+        Trip = self.with_context(tracking_disable=True)
+        for names, trip_ids in trip_vals.items():
+            Trip.browse(trip_ids).write({'unrouted_school_names': names or False})
+        return trips
+
+    @staticmethod
+    def _split_route(ordered, bus_count):
+        """
+        تقسيم المسار المرتب إلى أجزاء متتالية متقاربة الحجم، جزء لكل حافلة.
+        إذا زادت الحافلات عن المدارس تتكرر الأجزاء على الحافلات الإضافية.
+        """
+        parts = min(bus_count, len(ordered)) or 1
+        size, extra = divmod(len(ordered), parts)
+        chunks, position = [], 0
+        for index in range(parts):
+            step = size + (1 if index < extra else 0)
+            chunks.append(ordered[position:position + step])
+            position += step
+        return [chunks[index % parts] for index in range(bus_count)]
+
+    @api.model
+    def _plan_day_routes(self, date):
+        """تخطيط مسارات كل طلبات اليوم (للتشغيل من مهمة مجدولة أو من الواجهة)"""
+        trips = self.search([('date_from', '=', date), ('state', '!=', 'cancelled')])
+        planned = trips._plan_routes()
+        _logger.info("Planned routes for %s trips on %s", len(planned), date)
+        return planned
+
+    def action_plan_routes(self):
+        """تخطيط مسارات الطلبات المحددة"""
+        planned = self._plan_routes()
+        if not planned:
+            raise UserError("لا توجد طلبات بحافلات لتخطيط مساراتها.")
+        return planned._route_report("تخطيط المسارات")
+
+    def action_plan_day_routes(self):
+        """تخطيط مسارات كل الطلبات في أيام الطلبات المحددة"""
+        planned = self.browse()
+        for date in set(self.mapped('date_from')):
+            planned |= self._plan_day_routes(date)
+        return planned._route_report("تخطيط مسارات اليوم")
+
+    def _route_report(self, title):
+        """إشعار بعدد الطلبات المخططة مع المدارس التي بقيت خارج المسارات"""
+        message = f"تم تخطيط مسارات {len(self)} طلب."
+        unrouted = self.filtered('unrouted_school_names')
+        if not unrouted:
+            return self._notify_user(title, message, 'success')
+        details = ', '.join(f"{rec.name} ({rec.unrouted_school_names})" for rec in unrouted)
+        return self._notify_user(
+            title, f"{message} مدارس بلا إحداثيات لم تُضف لأي حافلة: {details}", 'warning'
+        )
+
+
+class SchoolTripBusLine(models.Model):
+    _inherit = 'school.trip.bus.line'
+
+    pickup_order = fields.Char(string="ترتيب الاستلام", readonly=True)
+    route_distance = fields.Float(string="مسافة المسار (كم)", digits=(16, 1), readonly=True)
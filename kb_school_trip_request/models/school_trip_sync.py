@@ -0,0 +1,146 @@
+# models/school_trip_sync.py
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from odoo import models, api
+from odoo.tools import frozendict
+
+from .school_trip_profile import profiled
+
+# مفتاح السياق الذي يمنع ارتداد المزامنة بين الفعالية وطلب الرحلة
+SYNC_GUARD_KEY = 'school_trip_sync_running'
+
+# الحقول المسموح تحديثها بـ SQL مباشرة: لا تعتمد على منطق في write لأي وحدة مثبتة،
+# وما يلزمها (الحقول المحسوبة والمرتبطة والقيود وسجل التغييرات) يُعاد يدوياً في _bulk_write.
+# أي حقل آخر يمر عبر write الكامل.
+BULK_SYNC_FIELDS = {
+    'school.trip.request': {'date_from', 'students_count', 'trip_purpose', 'direction_to'},
+    'event.event': {'date_begin', 'date_end', 'seats_max'},
+}
+
+
+class SchoolTripSync(models.AbstractModel):
+    _name = 'school.trip.sync'
+    _description = 'محرك مزامنة الفعاليات وطلبات الرحلات'
+
+    @api.model
+    def _is_sync_running(self):
+        """هل نحن داخل عملية مزامنة جارية؟"""
+        return bool(self.env.context.get(SYNC_GUARD_KEY))
+
+    @api.model
+    def _is_noop(self, record, fname, value):
+        """مقارنة القيمة الجديدة مع القيمة الحالية بعد تحويلها لنوع الحقل"""
+        field = record._fields[fname]
+        new_value = field.convert_to_record(field.convert_to_cache(value, record), record)
+        return record[fname] == new_value
+
+    @api.model
+    @profiled
+    def _propagate(self, updates, body=None):
+        """
+        تطبيق التحديثات على السجلات المرتبطة.
+
+        :param updates: قائمة من (السجل الهدف، القيم)
+        :param body: نص رسالة السجل للسجلات التي تغيرت فعلاً
+        :return: السجلات التي تم تحديثها
+        """
+        if self._is_sync_running():
+            return []
+
+        # تجاهل القيم غير المتغيرة، ثم التجميع حسب مجموعة الحقول (تحديث SQL واحد بقيم مختلفة)
+        # أو حسب القيم المتطابقة للحقول التي تحتاج write الكامل
+        bulk = self.env['school.trip.note']._mode() != 'tracking'
+        bulk_groups = defaultdict(dict)
+        groups = defaultdict(list)
+        for target, vals in updates:
+            changed = {
+                fname: value for fname, value in vals.items()
+                if not self._is_noop(target, fname, value)
+            }
+            if not changed:
+                continue
+            if bulk and all(self._is_bulk_field(target._fields[fname]) for fname in changed):
+                bulk_groups[(target._name, tuple(sorted(changed)))][target.id] = changed
+            else:
+                groups[(target._name, frozendict(changed))].append(target.id)
+
+        touched = defaultdict(list)
+        for (model_name, fnames), vals_by_id in bulk_groups.items():
+            self._bulk_write(model_name, fnames, vals_by_id)
+            touched[model_name].extend(vals_by_id)
+        for (model_name, vals), ids in groups.items():
+            targets = self.env[model_name].browse(ids)
+            targets.with_context(**{SYNC_GUARD_KEY: True}).write(dict(vals))
+            touched[model_name].extend(ids)
+
+        result = []
+        for model_name, ids in touched.items():
+            targets = self.env[model_name].browse(ids)
+            if body:
+                self.env['school.trip.note']._log(targets, dict.fromkeys(ids, body))
+            result.append(targets)
+        return result
+
+    # ------------------------------------------------------------
+    # Bulk Update
+    # ------------------------------------------------------------
+    @api.model
+    def _is_bulk_field(self, field):
+        """
+        الحقول القابلة للتحديث المباشر بـ SQL: أعمدة عادية مخزنة من القائمة المسموحة.
+        الحقول المترجمة (jsonb) والعلاقات المتعددة والمحسوبة تمر عبر write.
+        """
+        return (
+            field.name in BULK_SYNC_FIELDS.get(field.model_name, ())
+            and field.store and field.column_type and not field.compute
+            and not field.translate and field.type not in ('many2many', 'one2many')
+        )
+
+    @api.model
+    def _bulk_write(self, model_name, fnames, vals_by_id):
+        """
+        كتابة قيم مختلفة لكل سجل بعملية UPDATE ... FROM (VALUES ...) واحدة،
+        ثم إعلام المحرك بالتغيير حتى تُعاد الحقول المحسوبة والمرتبطة والقيود كما في write.
+
+        ما يُتخطى عمداً (لذلك تقتصر على BULK_SYNC_FIELDS):
+        - SchoolTripRequest.write و EventEvent.write: سجل التغييرات يُكتب هنا يدوياً،
+          والمزامنة العكسية ممنوعة أصلاً داخل المزامنة.
+        - تتبع البريد: لا يُستخدم هذا المسار في وضع التتبع.
+        - event.event.write في وحدة event: منطقه على stage_id و organizer_id فقط،
+          وجدولة رسائل الفعالية تُعاد حسابها من date_begin عبر modified.
+        """
+        Model = self.env[model_name]
+        records = Model.browse(list(vals_by_id))
+        fields_ = [Model._fields[fname] for fname in fnames]
+        records.check_access_rights('write')
+        records.check_access_rule('write')
+        Model.flush_model(fnames)
+        rows = []
+        params = []
+        for record in records:
+            vals = vals_by_id[record.id]
+            rows.append('(%s)' % ', '.join(['%s'] * (len(fields_) + 1)))
+            params.append(record.id)
+            params.extend(
+                field.convert_to_column(field.convert_to_cache(vals[field.name], record), record)
+                for field in fields_
+            )
+        self.env.cr.execute("""
+            UPDATE {table} AS t
+               SET {assignments}, write_uid = %s, write_date = %s
+              FROM (VALUES {rows}) AS v(id, {columns})
+             WHERE t.id = v.id
+        """.format(
+            table=Model._table,
+            assignments=', '.join(
+                '"{name}" = v."{name}"::{type}'.format(name=field.name, type=field.column_type[1])
+                for field in fields_
+            ),
+            rows=', '.join(rows),
+            columns=', '.join('"%s"' % field.name for field in fields_),
+        ), [self.env.uid, self.env.cr.now()] + params)
+        records.invalidate_recordset(list(fnames) + ['write_uid', 'write_date'])
+        records.modified(fnames)
+        records._validate_fields(fnames)
+        self.env['school.trip.change']._log(model_name, records.ids, 'write')
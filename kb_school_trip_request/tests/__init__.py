@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from . import test_bus_availability
+from . import test_event_count
+from . import test_performance
+from . import test_school_scope
+from . import test_trip_link_concurrency
+from . import test_trip_sequence
+from . import test_trip_sync
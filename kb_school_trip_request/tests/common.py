@@ -0,0 +1,123 @@
+# tests/common.py
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+class SchoolTripCommon(TransactionCase):
+    """
+    مولّد بيانات الاختبارات: مدرسة لكل 10 طلبات، حافلة وسائق لكل 20 طلباً،
+    وطلبات بحافلة واحدة موزعة على الأيام بحيث لا تتعارض الحجوزات.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.event_type = cls.env.ref('kb_school_trip_request.event_type_school_trip')
+        brand = cls.env['fleet.vehicle.model.brand'].create({'name': 'Trip Test'})
+        cls.bus_model = cls.env['fleet.vehicle.model'].create({
+            'name': 'Trip Test Bus',
+            'brand_id': brand.id,
+            'vehicle_type': 'bus',
+        })
+        # كل مجموعة بيانات تبدأ بعد سابقتها حتى لا تتعارض حجوزاتها
+        cls._next_start = fields.Date.today() + timedelta(days=30)
+
+    @classmethod
+    def _seed(cls, size):
+        """
+        مجموعة بيانات بحجم محدد: نصف الطلبات تُنشأ مباشرة ونصفها من فعاليات رحلات مدرسية.
+        :return: قاموس فيه schools, buses, start, trips, events
+        """
+        data = cls._seed_fleet(size)
+        trips = cls.env['school.trip.request'].create(cls._prepare_trips(data, size // 2))
+        events = cls._create_events(data, size - size // 2, offset=size // 2)
+        data['trips'] = trips | events.trip_id
+        data['events'] = events
+        return data
+
+    @classmethod
+    def _seed_fleet(cls, size):
+        """المدارس والحافلات والسائقون لعدد من الطلبات، بدون طلبات"""
+        prefix = len(cls.env['fleet.vehicle'].search([('model_id', '=', cls.bus_model.id)]))
+        schools = cls.env['school.school'].create([
+            {'name': 'مدرسة اختبار %s' % i} for i in range(max(size // 10, 1))
+        ])
+        bus_count = max(size // 20, 1)
+        drivers = cls.env['res.partner'].create([
+            {'name': 'سائق اختبار %s' % (prefix + i), 'mobile': '05%08d' % (prefix + i)}
+            for i in range(bus_count)
+        ])
+        buses = cls.env['fleet.vehicle'].create([{
+            'model_id': cls.bus_model.id,
+            'license_plate': 'TEST-%s' % (prefix + i),
+            'driver_id': driver.id,
+            'seats': 50,
+        } for i, driver in enumerate(drivers)])
+        start = cls._next_start
+        # الطلبات التي تُنشأ لاحقاً على نفس البيانات تستخدم فهارس حتى 3 أضعاف الحجم
+        cls._next_start = start + timedelta(days=3 * size // bus_count + 1)
+        return {'schools': schools, 'buses': buses, 'start': start}
+
+    @classmethod
+    def _slot(cls, data, index):
+        """حافلة وتاريخ فريدان لكل فهرس"""
+        buses = data['buses']
+        bus = buses[index % len(buses)]
+        return bus, data['start'] + timedelta(days=index // len(buses))
+
+    @classmethod
+    def _prepare_trips(cls, data, count, offset=0):
+        schools = data['schools']
+        vals_list = []
+        for index in range(offset, offset + count):
+            bus, date = cls._slot(data, index)
+            vals_list.append({
+                'trip_type': 'activity',
+                'date_from': date,
+                'students_count': 30,
+                'buses_count': 1,
+                'direction_to': 'وجهة اختبار',
+                'trip_purpose': 'رحلة اختبار %s' % index,
+                'stage': 'primary',
+                'applicant_name': 'مقدم اختبار',
+                'applicant_mobile': '0500000000',
+                'school_leader_name': 'قائد اختبار',
+                'school_ids': [(6, 0, schools[index % len(schools)].ids)],
+                'bus_line_ids': [(0, 0, {'vehicle_id': bus.id, 'driver_id': bus.driver_id.id})],
+            })
+        return vals_list
+
+    @classmethod
+    def _prepare_events(cls, data, count, offset=0):
+        vals_list = []
+        for index in range(offset, offset + count):
+            _bus, date = cls._slot(data, index)
+            vals_list.append({
+                'name': 'فعالية اختبار %s' % index,
+                'event_type_id': cls.event_type.id,
+                'date_begin': fields.Datetime.to_datetime(date) + timedelta(hours=8),
+                'date_end': fields.Datetime.to_datetime(date) + timedelta(hours=14),
+                'seats_max': 30,
+            })
+        return vals_list
+
+    @classmethod
+    def _create_events(cls, data, count, offset=0):
+        """فعاليات رحلات مدرسية تُنشئ طلباتها تلقائياً، ثم تُضاف حافلة ومدرسة لكل طلب"""
+        events = cls.env['event.event'].create(cls._prepare_events(data, count, offset))
+        schools = data['schools']
+        line_vals = []
+        for index, event in zip(range(offset, offset + count), events):
+            bus, _date = cls._slot(data, index)
+            if event.trip_id:
+                event.trip_id.school_ids = schools[index % len(schools)]
+                line_vals.append({
+                    'trip_id': event.trip_id.id,
+                    'vehicle_id': bus.id,
+                    'driver_id': bus.driver_id.id,
+                })
+        cls.env['school.trip.bus.line'].create(line_vals)
+        return events
@@ -0,0 +1,47 @@
+# tests/test_bus_availability.py
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+
+from .common import SchoolTripCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBusAvailability(SchoolTripCommon):
+    """منع حجز الحافلة أو السائق في رحلتين بنفس اليوم، ومنها نقل تاريخ طلب إلى يوم محجوز"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # حافلة واحدة: الطلبات المتتالية تحجزها في أيام متتالية
+        cls.data = cls._seed_fleet(2)
+        cls.trips = cls.env['school.trip.request'].create(cls._prepare_trips(cls.data, 2))
+
+    def test_reschedule_into_booking_is_rejected(self):
+        """نقل طلب إلى يوم حافلته محجوزة فيه لطلب آخر"""
+        first, second = self.trips
+        with self.assertRaises(ValidationError):
+            second.date_from = first.date_from
+
+    def test_reschedule_approved_trip_is_rejected(self):
+        first, second = self.trips
+        second.state = 'approved'
+        with self.assertRaises(ValidationError):
+            second.write({'date_from': first.date_from})
+
+    def test_event_reschedule_into_booking_is_rejected(self):
+        """المزامنة من الفعالية إلى الطلب تمر بنفس القيد"""
+        events = self._create_events(self.data, 2, offset=2)
+        first, second = events
+        begin = fields.Datetime.to_datetime(first.trip_id.date_from) + timedelta(hours=8)
+        with self.assertRaises(ValidationError):
+            second.write({'date_begin': begin, 'date_end': begin + timedelta(hours=6)})
+
+    def test_reschedule_to_free_day(self):
+        first, second = self.trips
+        free_day = second.date_from + timedelta(days=30)
+        second.date_from = free_day
+        self.assertEqual(second.bus_line_ids.date_from, free_day)
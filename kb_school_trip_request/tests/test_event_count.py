@@ -0,0 +1,37 @@
+# tests/test_event_count.py
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+
+from .common import SchoolTripCommon
+
+EVENT_COUNT_SIZE = 500
+# استعلام التجميع على الفعاليات وقراءة أسماء الطلبات للتجميع
+EVENT_COUNT_QUERIES = 2
+
+
+@tagged('post_install', '-at_install')
+class TestEventCount(SchoolTripCommon):
+    """event_count لمجموعة كاملة باستعلام مجمّع واحد"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.data = cls._seed(EVENT_COUNT_SIZE)
+
+    def test_event_count_batch(self):
+        trips = self.data['trips']
+        self.assertEqual(len(trips), EVENT_COUNT_SIZE)
+        self.env.invalidate_all()
+        with self.assertQueryCount(EVENT_COUNT_QUERIES):
+            counts = trips.mapped('event_count')
+        self.assertEqual(sum(counts), len(self.data['events']))
+        linked = self.data['events'].trip_id
+        for trip in trips:
+            self.assertEqual(trip.event_count, 1 if trip in linked else 0)
+
+    def test_event_count_single(self):
+        """نفس عدد الاستعلامات لسجل واحد ولـ 500 سجل"""
+        trip = self.data['events'][:1].trip_id
+        self.env.invalidate_all()
+        with self.assertQueryCount(EVENT_COUNT_QUERIES):
+            self.assertEqual(trip.event_count, 1)
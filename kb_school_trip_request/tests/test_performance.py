@@ -0,0 +1,217 @@
+# tests/test_performance.py
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import tempfile
+import time
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import SchoolTripCommon
+
+_logger = logging.getLogger(__name__)
+
+# الحجوم القياسية: الميزانية ثابتة، فأي مسار يعود لاستعلام لكل سجل يتجاوزها عند الحجم الأكبر
+PERF_SIZES = (10, 100)
+# الحجوم الكبيرة للقياس عند الطلب فقط: --test-tags trip_perf
+PERF_LARGE_SIZES = (10, 1000, 10000)
+
+# ميزانية الاستعلامات الثابتة لكل سيناريو مهما كان الحجم
+QUERY_BUDGETS = {
+    'trip_create': 60,
+    'trip_write': 40,
+    'trip_unlink': 40,
+    'event_create': 120,
+    'event_write': 60,
+    'event_unlink': 60,
+    'compute_event_count': 5,
+    'compute_school_names': 10,
+    'check_unique_vehicle': 10,
+    'action_submit': 40,
+    'action_leader_approve': 40,
+    'action_approve': 40,
+    'action_cancel': 40,
+    'action_reset_to_draft': 40,
+    'report_render': 80,
+}
+
+# عدد الطلبات المعروضة في سيناريو التقرير مهما كان الحجم
+REPORT_SAMPLE_SIZE = 100
+
+# ملف النتائج: من متغير البيئة أو ملف مؤقت باسم يحمل وقت التشغيل
+PERF_OUTPUT_ENV = 'TRIP_PERF_OUTPUT'
+
+
+@tagged('post_install', '-at_install', 'trip_perf')
+class TestTripPerformance(SchoolTripCommon):
+    """
+    عدد الاستعلامات والزمن للمسارات الساخنة على بيانات مولّدة.
+    عدد الاستعلامات يجب ألا يعتمد على عدد السجلات، والنتائج تُكتب كملف JSON للمقارنة بين التشغيلات.
+    """
+
+    sizes = PERF_SIZES
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._write_results()
+        super().tearDownClass()
+
+    @classmethod
+    def _write_results(cls):
+        """كتابة نتائج كل السيناريوهات والحجوم في ملف JSON واحد"""
+        if not cls.results:
+            return
+        output = os.environ.get(PERF_OUTPUT_ENV) or os.path.join(
+            tempfile.gettempdir(),
+            'school_trip_perf_%s_%s.json' % (
+                cls.__name__, fields.Datetime.now().strftime('%Y%m%d%H%M%S')),
+        )
+        report = {
+            'date': fields.Datetime.to_string(fields.Datetime.now()),
+            'database': cls.env.cr.dbname,
+            'suite': cls.__name__,
+            'sizes': list(cls.sizes),
+            'results': cls.results,
+            'failed': sorted({
+                result['scenario'] for result in cls.results if not result['passed']
+            }),
+        }
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        _logger.info(
+            "Trip performance results written to %s: %s measurements, %s over budget",
+            output, len(cls.results), len(report['failed']),
+        )
+
+    def _check_budget(self, scenario, func, prepare=None):
+        """
+        تشغيل السيناريو على كل حجم ببيانات جديدة، وتسجيل عدد الاستعلامات والزمن
+        ثم التحقق من الميزانية الثابتة.
+        :param prepare: تهيئة الطلبات قبل القياس (مثل نقلها إلى الحالة السابقة للانتقال)
+        """
+        budget = QUERY_BUDGETS[scenario]
+        for size in self.sizes:
+            with self.subTest(scenario=scenario, size=size):
+                data = self._seed(size)
+                if prepare:
+                    prepare(data['trips'])
+                self.env.flush_all()
+                self.env.invalidate_all()
+                queries_before = self.cr.sql_log_count
+                started = time.perf_counter()
+                func(data, size)
+                self.env.flush_all()
+                elapsed = time.perf_counter() - started
+                queries = self.cr.sql_log_count - queries_before
+                self.results.append({
+                    'scenario': scenario,
+                    'size': size,
+                    'queries': queries,
+                    'budget': budget,
+                    'seconds': round(elapsed, 4),
+                    'ms_per_record': round(elapsed * 1000 / size, 4),
+                    'passed': queries <= budget,
+                })
+                self.assertLessEqual(
+                    queries, budget,
+                    "%s at %s records: %s queries, budget %s" % (scenario, size, queries, budget),
+                )
+
+    def _recompute(self, records, fname):
+        self.env.add_to_compute(records._fields[fname], records)
+        records.flush_recordset([fname])
+
+    # ------------------------------------------------------------
+    # CRUD
+    # ------------------------------------------------------------
+    def test_trip_create(self):
+        self._check_budget('trip_create', lambda data, size: self.env['school.trip.request'].create(
+            self._prepare_trips(data, size, offset=size)
+        ))
+
+    def test_trip_write(self):
+        self._check_budget('trip_write', lambda data, size: data['trips'].write(
+            {'students_count': 40, 'trip_purpose': 'قياس'}
+        ))
+
+    def test_trip_unlink(self):
+        self._check_budget('trip_unlink', lambda data, size: data['trips'].unlink())
+
+    def test_event_create(self):
+        self._check_budget('event_create', lambda data, size: self.env['event.event'].create(
+            self._prepare_events(data, size, offset=2 * size)
+        ))
+
+    def test_event_write(self):
+        self._check_budget('event_write', lambda data, size: data['events'].write(
+            {'seats_max': 45, 'name': 'فعالية قياس'}
+        ))
+
+    def test_event_unlink(self):
+        self._check_budget('event_unlink', lambda data, size: data['events'].unlink())
+
+    # ------------------------------------------------------------
+    # Computes & Constraints
+    # ------------------------------------------------------------
+    def test_compute_event_count(self):
+        self._check_budget('compute_event_count', lambda data, size: data['trips'].mapped('event_count'))
+
+    def test_compute_school_names(self):
+        self._check_budget(
+            'compute_school_names', lambda data, size: self._recompute(data['trips'], 'school_names')
+        )
+
+    def test_check_unique_vehicle(self):
+        self._check_budget(
+            'check_unique_vehicle', lambda data, size: data['trips'].bus_line_ids._check_unique_vehicle()
+        )
+
+    # ------------------------------------------------------------
+    # Workflow
+    # ------------------------------------------------------------
+    def test_action_submit(self):
+        self._check_budget('action_submit', lambda data, size: data['trips'].action_submit())
+
+    def test_action_leader_approve(self):
+        self._check_budget(
+            'action_leader_approve', lambda data, size: data['trips'].action_leader_approve(),
+            prepare=lambda trips: trips.action_submit(),
+        )
+
+    def test_action_approve(self):
+        def prepare(trips):
+            trips.action_submit()
+            trips.action_leader_approve()
+        self._check_budget('action_approve', lambda data, size: data['trips'].action_approve(), prepare=prepare)
+
+    def test_action_cancel(self):
+        self._check_budget('action_cancel', lambda data, size: data['trips'].action_cancel())
+
+    def test_action_reset_to_draft(self):
+        self._check_budget(
+            'action_reset_to_draft', lambda data, size: data['trips'].action_reset_to_draft(),
+            prepare=lambda trips: trips.action_cancel(),
+        )
+
+    # ------------------------------------------------------------
+    # Report
+    # ------------------------------------------------------------
+    def test_report_render(self):
+        report = self.env.ref('kb_school_trip_request.action_school_trip_report_pdf')
+        self._check_budget('report_render', lambda data, size: self.env['ir.actions.report']._render_qweb_html(
+            report.report_name, res_ids=data['trips'][:REPORT_SAMPLE_SIZE].ids
+        ))
+
+
+@tagged('post_install', '-at_install', '-standard', 'trip_perf')
+class TestTripPerformanceLarge(TestTripPerformance):
+    """نفس السيناريوهات على 1000 و10000 سجل، ثقيلة فلا تعمل مع الاختبارات القياسية"""
+
+    sizes = PERF_LARGE_SIZES
@@ -0,0 +1,166 @@
+# tests/test_school_scope.py
+# -*- coding: utf-8 -*-
+import logging
+import time
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, new_test_user
+
+_logger = logging.getLogger(__name__)
+
+# حجم قاعدة القياس: 500 ألف طلب موزعة على 500 مدرسة
+SCOPE_TRIP_COUNT = 500000
+SCOPE_SCHOOL_COUNT = 500
+# عدد مدارس القائد
+LEADER_SCHOOL_COUNT = 3
+
+LIST_FIELDS = [
+    'name', 'trip_type', 'date_from', 'day_name', 'students_count',
+    'buses_count', 'trip_purpose', 'state',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestSchoolScope(TransactionCase):
+    """قواعد نطاق المدارس: ما يراه قائد المدرسة ومقدم الطلب"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.schools = cls.env['school.school'].create([
+            {'name': 'مدرسة نطاق %s' % i} for i in range(LEADER_SCHOOL_COUNT + 1)
+        ])
+        cls.leader = new_test_user(
+            cls.env, login='trip_scope_leader',
+            groups='base.group_user,kb_school_trip_request.group_trip_leader',
+        )
+        cls.leader.trip_school_ids = cls.schools[:LEADER_SCHOOL_COUNT]
+        cls.event_type = cls.env.ref('kb_school_trip_request.event_type_school_trip')
+
+    def _create_event(self, user):
+        return self.env['event.event'].create({
+            'name': 'فعالية نطاق',
+            'event_type_id': self.event_type.id,
+            'date_begin': '2024-03-01 08:00:00',
+            'date_end': '2024-03-01 14:00:00',
+            'user_id': user.id,
+        })
+
+    def test_auto_created_trip_is_scoped(self):
+        """الطلب المنشأ من فعالية يحمل مدارس مسؤولها فيراه قائد المدرسة"""
+        trip = self._create_event(self.leader).trip_id
+        self.assertEqual(trip.school_ids, self.leader.trip_school_ids)
+        Trip = self.env['school.trip.request'].with_user(self.leader)
+        self.assertEqual(Trip.search([('id', '=', trip.id)]), trip)
+
+    def test_other_school_is_hidden(self):
+        trip = self._create_event(self.leader).trip_id
+        trip.school_ids = self.schools[-1:]
+        Trip = self.env['school.trip.request'].with_user(self.leader)
+        self.assertFalse(Trip.search([('id', '=', trip.id)]))
+        self.assertFalse(
+            self.env['school.trip.bus.line'].with_user(self.leader).search([('trip_id', '=', trip.id)])
+        )
+
+    def test_submit_skips_trips_without_schools(self):
+        """الطلب بلا مدارس يُتخطى ويُذكر في التقرير، وبقية التحديد يُرسل"""
+        trips = self._create_event(self.leader).trip_id | self._create_event(self.env.user).trip_id
+        trips[1].school_ids = False
+        result = trips.action_submit()
+        self.assertEqual(trips.mapped('state'), ['leader', 'draft'])
+        self.assertEqual(result['params']['type'], 'warning')
+        self.assertIn(trips[1].name, result['params']['message'])
+        self.assertNotIn(trips[0].name, result['params']['message'])
+
+
+@tagged('post_install', '-at_install', '-standard', 'trip_perf')
+class TestSchoolScopePerformance(TransactionCase):
+    """
+    زمن قائمة قائد ثلاث مدارس على 500 ألف طلب.
+    ثقيل فلا يعمل مع الاختبارات القياسية: --test-tags trip_perf
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.schools = cls.env['school.school'].create([
+            {'name': 'مدرسة نطاق %s' % i} for i in range(SCOPE_SCHOOL_COUNT)
+        ])
+        cls.leader = new_test_user(
+            cls.env, login='trip_scope_leader',
+            groups='base.group_user,kb_school_trip_request.group_trip_leader',
+        )
+        cls.leader.trip_school_ids = cls.schools[:LEADER_SCHOOL_COUNT]
+        cls.manager = new_test_user(
+            cls.env, login='trip_scope_manager',
+            groups='base.group_user,kb_school_trip_request.group_trip_manager',
+        )
+        cls._seed_trips()
+
+    @classmethod
+    def _seed_trips(cls):
+        """إدراج الطلبات وروابط مدارسها بـ SQL مباشرة، طلب لكل مدرسة بالتناوب"""
+        Trip = cls.env['school.trip.request']
+        field = Trip._fields['school_ids']
+        cls.env.cr.execute("""
+            INSERT INTO school_trip_request (
+                name, trip_type, date_from, students_count, buses_count, direction_to,
+                trip_purpose, stage, applicant_name, school_leader_name, state, active,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT 'SCOPE/' || g, 'activity', DATE '2024-01-01' + (g %% 365), 30, 1, 'وجهة',
+                   'رحلة نطاق', 'primary', 'مقدم', 'قائد',
+                   (ARRAY['draft', 'leader', 'transport', 'approved'])[1 + g %% 4], TRUE,
+                   %(uid)s, now() AT TIME ZONE 'UTC', %(uid)s, now() AT TIME ZONE 'UTC'
+              FROM generate_series(1, %(count)s) g
+        """, {'uid': cls.env.uid, 'count': SCOPE_TRIP_COUNT})
+        cls.env.cr.execute("""
+            INSERT INTO {relation} ({column1}, {column2})
+            SELECT t.id, (%(school_ids)s::int[])[1 + t.id %% %(school_count)s]
+              FROM school_trip_request t
+             WHERE t.name LIKE 'SCOPE/%%'
+        """.format(relation=field.relation, column1=field.column1, column2=field.column2), {
+            'school_ids': cls.schools.ids,
+            'school_count': SCOPE_SCHOOL_COUNT,
+        })
+        cls.env.cr.execute("ANALYZE school_trip_request")
+        cls.env.cr.execute("ANALYZE {}".format(field.relation))
+        cls.env.invalidate_all()
+
+    def _open_list(self, user):
+        Trip = self.env['school.trip.request'].with_user(user)
+        count = Trip.search_count([])
+        rows = Trip.search_read([], LIST_FIELDS, limit=80, order='id desc')
+        groups = Trip.read_group([], ['state'], ['state'])
+        return count, rows, groups
+
+    def _measure_list(self, user):
+        """عدد الاستعلامات والزمن لفتح القائمة بعد تهيئة ذاكرة القواعد والصلاحيات"""
+        self._open_list(user)
+        self.env.invalidate_all()
+        queries_before = self.cr.sql_log_count
+        started = time.perf_counter()
+        self._open_list(user)
+        return self.cr.sql_log_count - queries_before, time.perf_counter() - started
+
+    def test_leader_sees_only_own_schools(self):
+        count, rows, groups = self._open_list(self.leader)
+        expected = SCOPE_TRIP_COUNT * LEADER_SCHOOL_COUNT // SCOPE_SCHOOL_COUNT
+        self.assertAlmostEqual(count, expected, delta=LEADER_SCHOOL_COUNT)
+        self.assertEqual(sum(group['state_count'] for group in groups), count)
+        trips = self.env['school.trip.request'].browse([row['id'] for row in rows])
+        self.assertFalse(trips.filtered(lambda trip: not trip.school_ids & self.leader.trip_school_ids))
+
+    def test_leader_list_adds_no_queries(self):
+        """
+        قاعدة نطاق المدارس شرط داخل نفس الاستعلامات، فلا تضيف استعلامات عن قائمة المدير.
+        الزمن يُسجل فقط للمقارنة بين التشغيلات، لأنه يعتمد على الخادم.
+        """
+        manager_queries, manager_seconds = self._measure_list(self.manager)
+        leader_queries, leader_seconds = self._measure_list(self.leader)
+        _logger.info(
+            "Trip list over %s trips: manager %s queries in %.3fs, leader of %s schools %s queries in %.3fs",
+            SCOPE_TRIP_COUNT, manager_queries, manager_seconds,
+            LEADER_SCHOOL_COUNT, leader_queries, leader_seconds,
+        )
+        self.assertEqual(leader_queries, manager_queries)
@@ -0,0 +1,158 @@
+# tests/test_trip_link_concurrency.py
+# -*- coding: utf-8 -*-
+import random
+import threading
+from datetime import timedelta
+
+from odoo import api, fields, SUPERUSER_ID
+from odoo.exceptions import UserError, ValidationError
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+# عدد الخيوط المتزامنة وعدد الجولات لكل خيط
+STRESS_THREADS = 8
+STRESS_ROUNDS = 5
+# الطلبات المشتركة بين الخيوط، وعدد فعاليات كل خيط
+STRESS_TRIPS = 12
+EVENTS_PER_THREAD = 3
+
+
+@tagged('post_install', '-at_install', '-standard', 'trip_perf')
+class TestTripLinkConcurrency(TransactionCase):
+    """
+    ربط الفعاليات بالطلبات وإنشاء فعاليات الرحلات من عدة خيوط، كل خيط بمؤشر مستقل من السجل.
+    البيانات تُحفظ فعلياً لأن المعاملات يجب أن ترى بعضها، ثم تُحذف في cleanup.
+    يعمل فقط عند الطلب: --test-tags trip_perf
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.event_ids = []
+        self.trip_ids = []
+        self.addCleanup(self._cleanup)
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            start = fields.Date.today() + timedelta(days=400)
+            trips = env['school.trip.request'].create([{
+                'trip_type': 'activity',
+                'date_from': start + timedelta(days=index),
+                'students_count': 30,
+                'buses_count': 1,
+                'direction_to': 'وجهة تزامن',
+                'trip_purpose': 'رحلة تزامن %s' % index,
+                'stage': 'primary',
+                'applicant_name': 'مقدم تزامن',
+                'school_leader_name': 'قائد تزامن',
+            } for index in range(STRESS_TRIPS)])
+            events = env['event.event'].create([
+                self._event_vals(start, index) for index in range(STRESS_THREADS * EVENTS_PER_THREAD)
+            ])
+            self.trip_ids = trips.ids
+            self.event_ids = events.ids
+        self.start = start
+
+    def _event_vals(self, start, index, event_type=None):
+        begin = fields.Datetime.to_datetime(start) + timedelta(days=index % STRESS_TRIPS, hours=8)
+        vals = {
+            'name': 'فعالية تزامن %s' % index,
+            'date_begin': begin,
+            'date_end': begin + timedelta(hours=6),
+        }
+        if event_type:
+            vals['event_type_id'] = event_type.id
+        return vals
+
+    def _cleanup(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            events = env['event.event'].browse(self.event_ids).exists()
+            trips = env['school.trip.request'].browse(self.trip_ids) | events.trip_id
+            events.unlink()
+            trips.exists().unlink()
+
+    def _run_threads(self, calls):
+        """تشغيل الخيوط معاً خلف حاجز وإرجاع الأخطاء غير المتوقعة
+        :param calls: قائمة (دالة, وسائط) لكل خيط
+        """
+        barrier = threading.Barrier(len(calls))
+        unexpected = []
+
+        def run(target, args):
+            try:
+                barrier.wait()
+                target(*args)
+            except Exception as e:
+                unexpected.append(repr(e))
+
+        threads = [threading.Thread(target=run, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return unexpected
+
+    def _link_worker(self, event_ids, outcome):
+        """كل جولة تربط فعاليات الخيط بطلبات عشوائية مشتركة مع الخيوط الأخرى"""
+        rng = random.Random()
+        for _round in range(STRESS_ROUNDS):
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                links = dict(zip(event_ids, rng.sample(self.trip_ids, len(event_ids))))
+                try:
+                    env['event.event']._set_trip_links(links)
+                    cr.commit()
+                    outcome.append('linked')
+                except (ValidationError, UserError):
+                    cr.rollback()
+                    outcome.append('rejected')
+
+    def _create_worker(self, index, created):
+        """إنشاء فعاليات رحلات مدرسية تنشئ طلباتها وتربطها تلقائياً"""
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            event_type = env.ref('kb_school_trip_request.event_type_school_trip')
+            events = env['event.event'].create([
+                self._event_vals(self.start, index * EVENTS_PER_THREAD + offset, event_type)
+                for offset in range(EVENTS_PER_THREAD)
+            ])
+            cr.commit()
+            created.extend(events.ids)
+
+    def _assert_consistent_links(self, created_ids):
+        """
+        الطرفان متطابقان بعد انتهاء الخيوط: الفعالية المحسوبة لكل طلب تشير إليه،
+        وكل فعالية رحلة مدرسية جديدة مرتبطة بطلبها.
+        """
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            events = env['event.event'].browse(self.event_ids)
+            created = env['event.event'].browse(created_ids)
+            trips = env['school.trip.request'].browse(self.trip_ids) | events.trip_id
+            for trip in trips:
+                with self.subTest(trip=trip.name):
+                    self.assertEqual(trip.event_ids, trip.event_id)
+                    if trip.event_id:
+                        self.assertEqual(trip.event_id.trip_id, trip)
+            for event in events.filtered('trip_id'):
+                with self.subTest(event=event.name):
+                    self.assertEqual(event.trip_id.event_id, event)
+            unlinked = created.filtered(lambda event: not event.trip_id)
+            self.assertFalse(unlinked, "School trip events left without a trip: %s" % unlinked.ids)
+
+    def test_concurrent_links_and_creates(self):
+        outcome = []
+        created = []
+        calls = [
+            (self._link_worker, (self.event_ids[index * EVENTS_PER_THREAD:(index + 1) * EVENTS_PER_THREAD], outcome))
+            for index in range(STRESS_THREADS)
+        ] + [
+            (self._create_worker, (index, created))
+            for index in range(STRESS_THREADS)
+        ]
+        unexpected = self._run_threads(calls)
+        self.event_ids += created
+        self.assertFalse(unexpected, "Unexpected errors in concurrent linking: %s" % unexpected)
+        self.assertEqual(len(outcome), STRESS_THREADS * STRESS_ROUNDS)
+        self.assertIn('linked', outcome)
+        self.assertEqual(len(created), STRESS_THREADS * EVENTS_PER_THREAD)
+        self._assert_consistent_links(created)
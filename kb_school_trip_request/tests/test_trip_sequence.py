@@ -0,0 +1,86 @@
+# tests/test_trip_sequence.py
+# -*- coding: utf-8 -*-
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+from .common import SchoolTripCommon
+
+# أحجام الدفعات: عدد استعلامات الحجز يجب أن يبقى ثابتاً من 10 إلى 10,000
+SEQUENCE_SIZES = (10, 10000)
+# أحجام دفعات الإنشاء الكامل (مدارس وحافلات ورسائل وسجل تغييرات)
+CREATE_SIZES = (10, 1000)
+
+
+@tagged('post_install', '-at_install')
+class TestTripSequence(TransactionCase):
+    """حجز أرقام الطلبات دفعة واحدة بتكلفة ثابتة مهما كان حجم الدفعة"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sequence = cls.env.ref('kb_school_trip_request.seq_school_trip_request')
+        cls.Trip = cls.env['school.trip.request']
+
+    def _reserve(self, count):
+        """الأرقام المحجوزة وعدد الاستعلامات المستخدمة"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        names = self.Trip._reserve_sequence_names(count)
+        return names, self.cr.sql_log_count - queries
+
+    def _check_flat_cost(self):
+        counts = []
+        for size in SEQUENCE_SIZES:
+            names, queries = self._reserve(size)
+            self.assertEqual(len(names), size)
+            self.assertEqual(len(set(names)), size, "Reserved trip numbers must be unique")
+            counts.append(queries)
+        self.assertEqual(
+            counts[0], counts[-1],
+            "Sequence queries grow with batch size: %s" % dict(zip(SEQUENCE_SIZES, counts)),
+        )
+
+    def test_standard_flat_cost(self):
+        self.sequence.implementation = 'standard'
+        self._check_flat_cost()
+
+    def test_no_gap_flat_cost(self):
+        self.sequence.implementation = 'no_gap'
+        self._check_flat_cost()
+
+    def test_no_gap_continues_sequence(self):
+        """الحجز بلا فجوات يكمل من الرقم التالي ويتقدم بحجم الدفعة"""
+        self.sequence.write({'implementation': 'no_gap', 'number_next': 7})
+        names, _queries = self._reserve(3)
+        prefix, suffix = self.sequence._get_prefix_suffix()
+        self.assertEqual(names, [prefix + '%04d' % number + suffix for number in (7, 8, 9)])
+        self.assertEqual(self.sequence._next(), prefix + '0010' + suffix)
+
+
+@tagged('post_install', '-at_install')
+class TestTripCreateCost(SchoolTripCommon):
+    """إنشاء الطلبات دفعة واحدة: عدد الاستعلامات لا يزيد مع حجم الدفعة"""
+
+    def _create(self, size):
+        data = self._seed_fleet(size)
+        vals_list = self._prepare_trips(data, size)
+        self.env.flush_all()
+        self.env.invalidate_all()
+        queries = self.cr.sql_log_count
+        trips = self.env['school.trip.request'].create(vals_list)
+        self.env.flush_all()
+        return trips, self.cr.sql_log_count - queries
+
+    def test_create_flat_cost(self):
+        counts = []
+        for size in CREATE_SIZES:
+            trips, queries = self._create(size)
+            self.assertEqual(len(trips), size)
+            self.assertEqual(len(set(trips.mapped('name'))), size)
+            self.assertFalse(trips.filtered(lambda trip: trip.name == 'New'))
+            counts.append(queries)
+        self.assertEqual(
+            counts[0], counts[-1],
+            "Trip create queries grow with batch size: %s" % dict(zip(CREATE_SIZES, counts)),
+        )
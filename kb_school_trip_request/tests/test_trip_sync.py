@@ -0,0 +1,61 @@
+# tests/test_trip_sync.py
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo.tests import tagged
+
+from .common import SchoolTripCommon
+
+# أحجام إعادة الجدولة الجماعية: عدد الاستعلامات يجب ألا يزيد مع عدد الفعاليات
+RESCHEDULE_SIZES = (10, 100)
+
+
+@tagged('post_install', '-at_install')
+class TestTripSync(SchoolTripCommon):
+    """مزامنة الفعاليات مع طلباتها عبر التحديث المجمّع"""
+
+    def _seed_same_day(self, size):
+        """فعاليات بطلبات في نفس اليوم، لكل طلب حافلته، فيمكن نقلها كلها معاً"""
+        data = self._seed_fleet(size * 20)
+        return self._create_events(data, size)
+
+    def _reschedule(self, events, days):
+        """نقل كل الفعاليات بكتابة واحدة، وإرجاع عدد الاستعلامات وأول سطر جديد في سجل التغييرات"""
+        begin = events[0].date_begin + timedelta(days=days)
+        self.env.flush_all()
+        self.env.invalidate_all()
+        self.cr.execute("SELECT COALESCE(max(id), 0) FROM school_trip_change")
+        last_change = self.cr.fetchone()[0]
+        queries = self.cr.sql_log_count
+        events.write({'date_begin': begin, 'date_end': begin + timedelta(hours=6)})
+        self.env.flush_all()
+        return self.cr.sql_log_count - queries, last_change
+
+    def test_mass_reschedule(self):
+        events = self._seed_same_day(RESCHEDULE_SIZES[0])
+        trips = events.trip_id
+        self.assertEqual(len(trips), len(events))
+        new_date = trips[0].date_from + timedelta(days=7)
+
+        _queries, last_change = self._reschedule(events, 7)
+
+        self.assertEqual(set(trips.mapped('date_from')), {new_date})
+        self.assertEqual(set(trips.bus_line_ids.mapped('date_from')), {new_date})
+        self.cr.execute("""
+            SELECT model, res_id FROM school_trip_change
+             WHERE id > %s AND operation = 'write'
+        """, [last_change])
+        journal = set(self.cr.fetchall())
+        self.assertTrue({('school.trip.request', trip.id) for trip in trips} <= journal)
+        self.assertTrue({('event.event', event.id) for event in events} <= journal)
+
+    def test_mass_reschedule_flat_cost(self):
+        counts = []
+        for size in RESCHEDULE_SIZES:
+            events = self._seed_same_day(size)
+            queries, _last_change = self._reschedule(events, 7)
+            counts.append(queries)
+        self.assertEqual(
+            counts[0], counts[-1],
+            "Reschedule queries grow with the number of events: %s" % dict(zip(RESCHEDULE_SIZES, counts)),
+        )
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from . import school_trip_import_wizard
+from . import school_trip_capacity_wizard
@@ -0,0 +1,66 @@
+# wizard/school_trip_capacity_wizard.py
+# -*- coding: utf-8 -*-
+from datetime import timedelta
+
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+
+class SchoolTripCapacityWizard(models.TransientModel):
+    _name = 'school.trip.capacity.wizard'
+    _description = 'لوحة توقعات سعة الأسطول'
+
+    date_start = fields.Date(
+        string="من تاريخ",
+        required=True,
+        default=fields.Date.context_today
+    )
+    date_end = fields.Date(
+        string="إلى تاريخ",
+        required=True,
+        default=lambda self: fields.Date.context_today(self) + timedelta(days=90)
+    )
+    only_overbooked = fields.Boolean(string="الأيام المتجاوزة للسعة فقط")
+    line_ids = fields.One2many(
+        'school.trip.capacity.line',
+        'wizard_id',
+        string="الأيام"
+    )
+
+    def action_forecast(self):
+        """حساب التوقعات للفترة وعرضها كقائمة ورسم بياني"""
+        self.ensure_one()
+        if self.date_end < self.date_start:
+            raise UserError("تاريخ النهاية يجب أن يكون بعد تاريخ البداية.")
+        forecast = self.env['school.trip.capacity']._forecast(self.date_start, self.date_end)
+        self.line_ids.unlink()
+        self.env['school.trip.capacity.line'].create([
+            dict(day, wizard_id=self.id)
+            for day in forecast
+            if day['demand_seats'] and (day['overbooked'] or not self.only_overbooked)
+        ])
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'توقعات سعة الأسطول',
+            'res_model': 'school.trip.capacity.line',
+            'view_mode': 'tree,graph',
+            'domain': [('wizard_id', '=', self.id)],
+            'target': 'current',
+        }
+
+
+class SchoolTripCapacityLine(models.TransientModel):
+    _name = 'school.trip.capacity.line'
+    _description = 'توقعات سعة الأسطول اليومية'
+    _order = 'date'
+
+    wizard_id = fields.Many2one('school.trip.capacity.wizard', ondelete='cascade')
+    date = fields.Date(string="التاريخ", readonly=True)
+    pending_seats = fields.Integer(string="مقاعد قيد الاعتماد", readonly=True)
+    approved_seats = fields.Integer(string="مقاعد معتمدة", readonly=True)
+    demand_seats = fields.Integer(string="إجمالي المقاعد المطلوبة", readonly=True)
+    demand_buses = fields.Integer(string="الحافلات المطلوبة", readonly=True)
+    supply_seats = fields.Integer(string="مقاعد الأسطول", group_operator='max', readonly=True)
+    supply_buses = fields.Integer(string="حافلات الأسطول", group_operator='max', readonly=True)
+    utilization = fields.Float(string="نسبة الإشغال %", group_operator='avg', readonly=True)
+    overbooked = fields.Boolean(string="تجاوز السعة", readonly=True)
@@ -0,0 +1,270 @@
+# wizard/school_trip_import_wizard.py
+# -*- coding: utf-8 -*-
+import base64
+import csv
+import io
+import logging
+from datetime import date, datetime
+from itertools import groupby
+
+from odoo import models, fields
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+
+from ..models.school_trip_request import is_valid_mobile, MOBILE_ERROR
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from openpyxl import load_workbook
+except ImportError:
+    _logger.debug("openpyxl not available, XLSX trip import disabled")
+    load_workbook = None
+
+# أعمدة ملف الاستيراد: صف لكل حافلة، والصفوف المتتالية بنفس المرجع تتبع نفس الرحلة
+TRIP_COLUMNS = [
+    'trip_type', 'date_from', 'students_count', 'buses_count', 'direction_from',
+    'direction_to', 'trip_purpose', 'stage', 'applicant_name', 'applicant_mobile',
+    'school_leader_name',
+]
+REQUIRED_COLUMNS = [
+    'trip_type', 'date_from', 'students_count', 'buses_count', 'direction_to',
+    'trip_purpose', 'stage', 'applicant_name', 'school_leader_name',
+]
+
+
+class SchoolTripImportWizard(models.TransientModel):
+    _name = 'school.trip.import.wizard'
+    _description = 'استيراد طلبات الرحلات'
+
+    file = fields.Binary(string="الملف", required=True)
+    filename = fields.Char(string="اسم الملف")
+    chunk_size = fields.Integer(string="حجم الدفعة", default=500, required=True)
+    track_history = fields.Boolean(
+        string="تتبع السجل أثناء الاستيراد",
+        help="تسجيل رسائل الإنشاء والتتبع لكل طلب، مما يبطئ الاستيراد."
+    )
+    state = fields.Selection([
+        ('upload', 'رفع الملف'),
+        ('done', 'مكتمل'),
+    ], default='upload')
+    imported_count = fields.Integer(string="الطلبات المستوردة", readonly=True)
+    error_count = fields.Integer(string="الصفوف المرفوضة", readonly=True)
+    error_log = fields.Text(string="تقرير الأخطاء", readonly=True)
+
+    # ------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------
+    def _iter_rows(self):
+        """قراءة صفوف الملف تدريجياً كقواميس مع رقم الصف"""
+        raw = base64.b64decode(self.file)
+        if (self.filename or '').lower().endswith('.xlsx'):
+            if load_workbook is None:
+                raise UserError("مكتبة openpyxl غير متوفرة، يرجى استخدام ملف CSV.")
+            sheet = load_workbook(io.BytesIO(raw), read_only=True, data_only=True).active
+            rows = sheet.iter_rows(values_only=True)
+            header = [str(cell or '').strip() for cell in next(rows, ())]
+            for row_number, row in enumerate(rows, start=2):
+                if any(cell not in (None, '') for cell in row):
+                    yield row_number, dict(zip(header, row))
+        else:
+            reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(raw), encoding='utf-8-sig'))
+            for row_number, row in enumerate(reader, start=2):
+                yield row_number, {key.strip(): value for key, value in row.items() if key}
+
+    def _iter_trips(self):
+        """تجميع الصفوف المتتالية ذات المرجع نفسه في رحلة واحدة"""
+        def trip_key(item):
+            row_number, row = item
+            return row.get('ref') or 'row-%s' % row_number
+
+        for _key, items in groupby(self._iter_rows(), key=trip_key):
+            yield list(items)
+
+    # ------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------
+    def _selection_map(self, fname):
+        """قبول المفتاح أو التسمية لحقول الاختيار"""
+        field = self.env['school.trip.request']._fields[fname]
+        mapping = {}
+        for key, label in field._description_selection(self.env):
+            mapping[key] = key
+            mapping[label] = key
+        return mapping
+
+    def _build_lookups(self):
+        """خرائط بحث في الذاكرة تُبنى مرة واحدة لكل عملية استيراد"""
+        schools = self.env['school.school'].search_read([], ['name'])
+        vehicles = self.env['fleet.vehicle'].search_read(
+            [('vehicle_type', '=', 'bus'), ('license_plate', '!=', False)],
+            ['license_plate', 'driver_id']
+        )
+        return {
+            'schools': {school['name']: school['id'] for school in schools},
+            'vehicles': {
+                vehicle['license_plate'].strip(): (
+                    vehicle['id'], vehicle['driver_id'] and vehicle['driver_id'][0]
+                )
+                for vehicle in vehicles
+            },
+            'selections': {
+                fname: self._selection_map(fname) for fname in ('trip_type', 'stage')
+            },
+        }
+
+    # ------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------
+    @staticmethod
+    def _clean(value):
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return str(value).strip()
+
+    def _parse_date(self, value):
+        if isinstance(value, datetime):
+            return value.date()
+        if isinstance(value, date):
+            return value
+        return fields.Date.to_date(self._clean(value))
+
+    def _prepare_trip(self, items, lookups, drivers):
+        """تحويل صفوف رحلة واحدة إلى قيم إنشاء أو قائمة أخطاء"""
+        row_number, row = items[0]
+        errors = []
+        vals = {fname: self._clean(row.get(fname)) for fname in TRIP_COLUMNS}
+
+        for fname in REQUIRED_COLUMNS:
+            if not vals[fname]:
+                errors.append(f"الحقل {fname} مطلوب")
+        for fname in ('trip_type', 'stage'):
+            if vals[fname]:
+                key = lookups['selections'][fname].get(vals[fname])
+                if not key:
+                    errors.append(f"قيمة غير صحيحة للحقل {fname}: {vals[fname]}")
+                vals[fname] = key
+        for fname in ('students_count', 'buses_count'):
+            try:
+                vals[fname] = int(vals[fname] or 0)
+            except ValueError:
+                vals[fname] = 0
+            if vals[fname] <= 0:
+                errors.append(f"الحقل {fname} يجب أن يكون أكبر من صفر")
+        if vals['applicant_mobile'] and not is_valid_mobile(vals['applicant_mobile']):
+            errors.append(MOBILE_ERROR)
+        try:
+            vals['date_from'] = self._parse_date(row.get('date_from'))
+        except ValueError:
+            errors.append(f"تاريخ غير صحيح: {row.get('date_from')}")
+
+        school_ids = []
+        for school_name in filter(None, (name.strip() for name in self._clean(row.get('schools')).split(';'))):
+            school_id = lookups['schools'].get(school_name)
+            if not school_id:
+                errors.append(f"المدرسة غير موجودة: {school_name}")
+            school_ids.append(school_id)
+        vals['school_ids'] = [(6, 0, school_ids)]
+
+        line_commands = []
+        for line_row_number, line_row in items:
+            plate = self._clean(line_row.get('license_plate'))
+            if not plate:
+                continue
+            vehicle = lookups['vehicles'].get(plate)
+            if not vehicle:
+                errors.append(f"الصف {line_row_number}: الحافلة غير موجودة: {plate}")
+                continue
+            vehicle_id, driver_id = vehicle
+            driver_name = self._clean(line_row.get('driver'))
+            if driver_name:
+                driver_id = drivers.get(driver_name)
+                if not driver_id:
+                    errors.append(f"الصف {line_row_number}: السائق غير موجود: {driver_name}")
+            line_commands.append((0, 0, {
+                'vehicle_id': vehicle_id,
+                'driver_id': driver_id or False,
+                'notes': self._clean(line_row.get('bus_notes')) or False,
+            }))
+        vals['bus_line_ids'] = line_commands
+        return row_number, vals, errors
+
+    # ------------------------------------------------------------
+    # Import
+    # ------------------------------------------------------------
+    def _import_chunk(self, Trip, trips, lookups):
+        """التحقق من الدفعة كاملة ثم إنشاؤها داخل نقطة حفظ مستقلة"""
+        driver_names = {
+            self._clean(row.get('driver'))
+            for items in trips for _row_number, row in items
+        } - {''}
+        drivers = {}
+        if driver_names:
+            drivers = {
+                partner['name']: partner['id']
+                for partner in self.env['res.partner'].search_read(
+                    [('name', 'in', list(driver_names))], ['name']
+                )
+            }
+
+        errors = []
+        valid = []
+        for items in trips:
+            row_number, vals, row_errors = self._prepare_trip(items, lookups, drivers)
+            if row_errors:
+                errors.extend(f"الصف {row_number}: {error}" for error in row_errors)
+            else:
+                valid.append((row_number, vals))
+
+        imported = 0
+        if valid:
+            try:
+                with self.env.cr.savepoint():
+                    Trip.create([vals for _row_number, vals in valid])
+                imported = len(valid)
+            except Exception:
+                # تحديد الصفوف المسببة للخطأ بإعادة المحاولة لكل رحلة على حدة
+                for row_number, vals in valid:
+                    try:
+                        with self.env.cr.savepoint():
+                            Trip.create(vals)
+                        imported += 1
+                    except Exception as e:
+                        errors.append(f"الصف {row_number}: {e}")
+        return imported, errors
+
+    def action_import(self):
+        """استيراد الملف على دفعات بحجم ثابت"""
+        self.ensure_one()
+        if self.chunk_size <= 0:
+            raise UserError("حجم الدفعة يجب أن يكون أكبر من صفر.")
+        lookups = self._build_lookups()
+        Trip = self.env['school.trip.request'].with_context(
+            tracking_disable=not self.track_history,
+            mail_create_nosubscribe=True,
+        )
+        imported, errors = 0, []
+        for trips in split_every(self.chunk_size, self._iter_trips()):
+            chunk_imported, chunk_errors = self._import_chunk(Trip, trips, lookups)
+            imported += chunk_imported
+            errors.extend(chunk_errors)
+            # تفريغ ذاكرة السجلات بين الدفعات للحفاظ على استهلاك ثابت
+            self.env.invalidate_all()
+            _logger.info("Trip import: %s trips imported, %s errors so far", imported, len(errors))
+
+        self.write({
+            'state': 'done',
+            'imported_count': imported,
+            'error_count': len(errors),
+            'error_log': '\n'.join(errors) or False,
+        })
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'استيراد طلبات الرحلات',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }